@@ -0,0 +1,12 @@
+# app/products/model/column_name.py
+from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from .database import Base
+
+
+class ColumnName(Base):
+    __tablename__ = "column_names"
+
+    # Исходное (отображаемое) имя колонки, записанное при импорте: обратный транслит неоднозначен
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    sql_name = Column(String(255), primary_key=True)
+    display_name = Column(Text, nullable=False)
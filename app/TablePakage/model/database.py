@@ -1,6 +1,9 @@
 # app/products/model/database.py
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -12,7 +15,15 @@ host = os.getenv("DBHOST", "postgres")
 port = os.getenv("POSTGRES_PORT")
 database = os.getenv("POSTGRES_DB", "pdb")
 
-engine = create_async_engine(f'postgresql+asyncpg://{user}:{pswd}@{host}:{port}/{database}', echo=True)
+# Вывод SQL управляется логгером "sqlalchemy.engine" (SQL_ECHO в logging_config),
+# echo=True добавил бы собственный синхронный хэндлер в обход очереди логов
+DATABASE_URL = f'postgresql+asyncpg://{user}:{pswd}@{host}:{port}/{database}'
+
+# Размер пула соединений согласован с лимитами пулов допуска (ADMISSION_POOLS)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+engine = create_async_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -22,6 +33,14 @@ AsyncSessionLocal = async_sessionmaker(
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+_trgm_available = False
+
+
+def is_trgm_available() -> bool:
+    return _trgm_available
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -31,6 +50,16 @@ async def get_db():
             await session.close()
 
 
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def detect_trgm_extension() -> bool:
+    # Расширение и триграммные индексы создаёт миграция; воркер только узнаёт, есть ли они
+    global _trgm_available
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"))
+            _trgm_available = bool(result.scalar())
+    except DBAPIError as e:
+        logger.warning("Не удалось проверить расширение pg_trgm: %s", e.orig)
+        _trgm_available = False
+    if not _trgm_available:
+        logger.warning("Расширение pg_trgm недоступно, нечёткий поиск работает без индекса")
+    return _trgm_available
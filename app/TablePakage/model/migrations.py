@@ -0,0 +1,22 @@
+# app/products/model/migrations.py
+import asyncio
+import os
+
+# alembic.ini лежит в корне приложения (рядом с main.py)
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+# Миграции применяются отдельным шагом до старта воркеров (alembic upgrade head).
+# SCHEMA_AUTO_MIGRATE=true — применять их при старте (локальная разработка, бенчмарки)
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+
+
+def upgrade_head() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(ALEMBIC_INI), "head")
+
+
+async def run_migrations() -> None:
+    # env.py запускает свой event loop — выполняем в отдельном потоке
+    await asyncio.to_thread(upgrade_head)
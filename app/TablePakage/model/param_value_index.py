@@ -0,0 +1,25 @@
+# app/products/model/param_value_index.py
+from sqlalchemy import Column, Integer, Text, ForeignKey, Index, func
+from .database import Base
+
+
+class ParamValueIndex(Base):
+    __tablename__ = "param_value_index"
+
+    # Обратный индекс значений: в каких продуктах и параметрах встречается значение
+    value = Column(Text, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    parameter_schema_id = Column(
+        Integer, ForeignKey("parameter_schemas.id", ondelete="CASCADE"), primary_key=True
+    )
+    row_count = Column(Integer, nullable=False)
+
+
+# Пересчёт значений одного продукта/параметра и автодополнение по префиксу внутри параметра
+Index(
+    "ix_param_value_index_product_param_prefix",
+    ParamValueIndex.product_id,
+    ParamValueIndex.parameter_schema_id,
+    func.lower(ParamValueIndex.value).label("value_lower"),
+    postgresql_ops={"value_lower": "text_pattern_ops"},
+)
@@ -1,5 +1,5 @@
 # app/products/model/product.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -14,6 +14,30 @@ class Product(Base):
     image = Column(String(512))  # Путь к файлу изображения
     image_url = Column(String(512))  # URL изображения
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Хранилище строк: "table" — своя таблица <имя>_table, "jsonb" — секция product_rows
+    storage = Column(String(16), nullable=False, server_default="table")
+    # Уникальность строк: NULL — выключена, "ignore" — дубли пропускаются, "reject" — отклоняются
+    unique_rows = Column(String(16))
 
     # Связь с параметрами
     parameters = relationship("ParameterSchema", back_populates="product", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset-пагинация каталога по (created_at, id)
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_manufacturer", "manufacturer"),
+    )
+
+
+# Фильтр по префиксу имени без учёта регистра: lower(name) LIKE 'префикс%'
+Index(
+    "ix_products_name_lower_prefix",
+    func.lower(Product.name).label("name_lower"),
+    postgresql_ops={"name_lower": "text_pattern_ops"},
+)
+
+Index(
+    "ix_products_manufacturer_lower_prefix",
+    func.lower(Product.manufacturer).label("manufacturer_lower"),
+    postgresql_ops={"manufacturer_lower": "text_pattern_ops"},
+)
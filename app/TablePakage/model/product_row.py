@@ -0,0 +1,23 @@
+# app/products/model/product_row.py
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, Sequence, text
+from sqlalchemy.dialects.postgresql import JSONB
+from .database import Base
+
+# Общая последовательность: id строк растут монотонно внутри каждого продукта
+product_rows_id_seq = Sequence("product_rows_id_seq")
+
+
+class ProductRow(Base):
+    __tablename__ = "product_rows"
+
+    # Строки продуктов с хранилищем "jsonb": значения параметров — ключи data.
+    # Таблица секционирована по product_id (LIST), секция продукта создаётся при первой загрузке
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    id = Column(BigInteger, product_rows_id_seq, server_default=product_rows_id_seq.next_value(), primary_key=True)
+    data = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+
+    __table_args__ = (
+        # Поиск строк по значению параметра: data @> {"param": "value"}
+        Index("ix_product_rows_data", "data", postgresql_using="gin", postgresql_ops={"data": "jsonb_path_ops"}),
+        {"postgresql_partition_by": "LIST (product_id)"},
+    )
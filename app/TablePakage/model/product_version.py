@@ -0,0 +1,12 @@
+# app/products/model/product_version.py
+from sqlalchemy import Column, Integer, DateTime, func, ForeignKey
+from .database import Base
+
+
+class ProductVersion(Base):
+    __tablename__ = "product_versions"
+
+    # Версия данных продукта: растёт при любом изменении его таблицы или параметров
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
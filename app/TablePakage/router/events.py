@@ -0,0 +1,24 @@
+# app/products/router/events.py
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..utils.event_stream import event_hub
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+@router.get("/", description="Поток событий (text/event-stream): ход импорта (progress) и изменения продуктов (change).")
+async def stream_events(
+        request: Request,
+        product_id: Optional[list[int]] = Query(None, description="Только события этих продуктов; без параметра — все"),
+        last_event_id: Optional[str] = Header(None, description="Id последнего полученного события для дозагрузки пропущенных")
+):
+    # Без сессии БД и вне пулов допуска: ожидающее соединение стоит только очереди в памяти
+    subscriber = event_hub.subscribe(set(product_id) if product_id else None, last_event_id)
+    return StreamingResponse(
+        event_hub.stream(subscriber, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,29 @@
+# app/products/router/metrics.py
+from fastapi import APIRouter
+
+from ..model.database import engine
+from ..utils.admission import admission_stats
+from ..utils.change_bus import change_bus
+from ..utils.event_stream import event_hub
+from ..utils.export_cache import export_cache
+from ..utils.maintenance import vacuum_queue
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/", description="Состояние воркера: пулы допуска, пул соединений БД, кэши, шина изменений, подписчики событий и VACUUM.")
+async def get_metrics():
+    pool = engine.sync_engine.pool
+    return {
+        "admission": admission_stats(),
+        "db_pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        },
+        "export_cache": export_cache.stats(),
+        "change_bus": change_bus.stats(),
+        "events": event_hub.stats(),
+        "vacuum": vacuum_queue.stats(),
+    }
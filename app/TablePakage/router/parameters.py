@@ -1,6 +1,7 @@
 # app/products/router/parameters.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -10,7 +11,14 @@ from ..model.product import Product
 from ..model.parameter_schema import ParameterSchema
 from ..schema.parameter_schema import ParameterSchemaCreate, ParameterSchemaResponse, ParameterSchemaUpdate
 from ..utils.db_utils import create_or_alter_table
+from ..utils.column_names import record_display_names
 from ..utils.router_utils import to_sql_name_lat
+from ..utils.row_storage import get_storage
+from ..utils.admission import admit
+from ..utils.change_bus import publish
+from ..utils.version_utils import (
+    bump_version, cache_headers, get_product_version, is_not_modified, make_etag, not_modified_response
+)
 
 router = APIRouter(prefix="/parameters", tags=["Parameters"])
 
@@ -28,7 +36,8 @@ async def create_parameter_schema(
 
     # Проверка связи с продуктом
     product_result = await db.execute(select(Product).where(Product.id == schema.product_id))
-    if not product_result.scalar_one_or_none():
+    product = product_result.scalar_one_or_none()
+    if not product:
         raise HTTPException(status_code=400, detail="Invalid product_id")
 
     # Транслитерируем имя параметра
@@ -40,23 +49,57 @@ async def create_parameter_schema(
     )
     db.add(db_schema)
 
-    # Если тип Table — создаём или изменяем таблицу
+    # Если тип Table — создаём или изменяем таблицу (в хранилище jsonb колонка — ключ data, DDL не нужен)
     if schema.type == "Table":
         if not schema.table_name:
             raise HTTPException(status_code=400, detail="table_name is required for type 'Table'")
-        await create_or_alter_table(db, to_sql_name_lat(schema.table_name) + "_table",
-                                    to_sql_name_lat(schema.name))
-
+        if product.storage == "table":
+            await create_or_alter_table(db, to_sql_name_lat(schema.table_name) + "_table",
+                                        to_sql_name_lat(schema.name))
+            # Новая колонка входит в хэш строки — индекс уникальности пересоздаётся
+            if product.unique_rows:
+                storage = get_storage(product.id, product.name, product.storage, product.unique_rows)
+                await storage.create_unique_index(db)
+
+    await record_display_names(db, schema.product_id, {sql_param_name: schema.name})
+    await bump_version(db, schema.product_id)
+    await publish(db, schema.product_id, "parameter_schemas", "schema")
     await db.commit()
     await db.refresh(db_schema)
     return db_schema
 
-@router.get("/by_product/{product_id}", response_model=list[ParameterSchemaResponse], description="Выведение информации по параметрам продукта по его {ID}.")
-async def get_parameters(product_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/by_product/{product_id}", response_model=list[ParameterSchemaResponse], description="Выведение информации по параметрам продукта по его {ID}.",
+            dependencies=[Depends(admit("read"))])
+async def get_parameters(
+        product_id: int,
+        request: Request,
+        response: Response,
+        raw: bool = Query(False, description="Отдать строки без повторной валидации через ParameterSchemaResponse"),
+        db: AsyncSession = Depends(get_db)
+):
+    headers = {}
+    product = await get_product_version(db, product_id)
+    if product is not None:
+        etag = make_etag(product_id, product.version, "params")
+        if is_not_modified(request, etag, product.updated_at):
+            return not_modified_response(etag, product.updated_at)
+        headers = cache_headers(etag, product.updated_at)
+
+    if raw:
+        # Колонки таблицы напрямую, без ORM-объектов и response_model
+        result = await db.execute(
+            select(ParameterSchema.__table__).where(ParameterSchema.product_id == product_id)
+        )
+        params = [dict(row) for row in result.mappings().all()]
+        if not params:
+            raise HTTPException(status_code=404, detail="Parameters not found")
+        return ORJSONResponse(params, headers=headers)
+
     result = await db.execute(select(ParameterSchema).where(ParameterSchema.product_id == product_id))
     params = result.scalars().all()
     if not params:
         raise HTTPException(status_code=404, detail="Parameters not found")
+    response.headers.update(headers)
     return params
 
 @router.get("/{param_id}", response_model=ParameterSchemaResponse,
@@ -81,11 +124,19 @@ async def update_parameter(
     if not param:
         raise HTTPException(status_code=404, detail="Parameter not found")
 
+    old_product_id = param.product_id
     for key, value in schema_update.dict(exclude_unset=True).items():
         setattr(param, key, value)
 
-    await db.refresh(param)
+    # Изменения записываются в транзакцию до bump/publish (refresh здесь перечитал бы строку и отбросил их)
+    await db.flush()
+    await bump_version(db, old_product_id)
+    await publish(db, old_product_id, "parameter_schemas", "schema")
+    if param.product_id != old_product_id:
+        await bump_version(db, param.product_id)
+        await publish(db, param.product_id, "parameter_schemas", "schema")
     await db.commit()
+    await db.refresh(param)
     return param
 
 
@@ -102,5 +153,7 @@ async def delete_parameter(
         return HTTPException(status_code=404, detail="Parameter not found")
 
     await db.delete(param)
+    await bump_version(db, param.product_id)
+    await publish(db, param.product_id, "parameter_schemas", "schema")
     await db.commit()
     return param
@@ -1,58 +1,34 @@
 # app/products/router/products.py
-import os
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, Form, Body
+from fastapi import APIRouter, Depends, File, HTTPException, Form, Body, Query, Request, Response
 from fastapi import UploadFile
+from fastapi.responses import ORJSONResponse
 
+from sqlalchemy import func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-
-import uuid
-from pathlib import Path
-import imghdr
+from sqlalchemy.orm import selectinload
 
 from ..model.database import get_db
 from ..model.product import Product
-from ..schema.product import ProductUpdate, ProductResponse
+from ..schema.parameter_schema import ParameterSchemaResponse
+from ..schema.product import ProductUpdate, ProductResponse, ProductSnapshot, ParameterSnapshot
+from ..utils.cache_utils import snapshot_cache
+from ..utils.admission import admit
+from ..utils.change_bus import publish
+from ..utils.image_utils import save_image
+from ..utils.search_utils import autocomplete_products
+from ..utils.router_utils import decode_cursor, encode_cursor
+from ..utils.row_storage import DEFAULT_PRODUCT_STORAGE, STORAGES, get_storage
+from ..utils.table_utils import get_distinct_values, get_param_columns
+from ..utils.version_utils import (
+    bump_version, cache_headers, get_product_version, is_not_modified, make_etag, not_modified_response
+)
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
-UPLOAD_DIR = "./static/images"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-# Настройки
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 МБ
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
-
-
-def validate_image(file: UploadFile) -> None:
-    # Проверка размера
-    file.file.seek(0, 2)  # в конец
-    size = file.file.tell()
-    if size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large. Max size is 5 MB.")
-    file.file.seek(0)  # в начало
-
-    # Проверка расширения
-    ext = Path(file.filename).suffix.lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Invalid file extension. Allowed: .jpg, .jpeg, .png, .gif")
-
-    # Проверка содержимого
-    content = file.file.read(1024)
-    file.file.seek(0)
-    img_type = imghdr.what(None, h=content)
-    if not img_type:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-    if ext == ".jpg" and img_type not in ["jpeg", "jpg"]:
-        raise HTTPException(status_code=400, detail="File extension does not match content")
-
-
-def generate_unique_filename(original_filename: str) -> str:
-    ext = Path(original_filename).suffix
-    unique_name = f"{uuid.uuid4()}{ext}"
-    return unique_name
-
 
 # === Product Schema Endpoints ===
 
@@ -62,26 +38,27 @@ async def create_product(
         description: str = Form(None),
         manufacturer: str = Form(None),
         image: UploadFile = File(None),
+        storage: str = Form(DEFAULT_PRODUCT_STORAGE, description="Хранилище строк: table или jsonb"),
         db: AsyncSession = Depends(get_db)
 ):
+    if storage not in STORAGES:
+        raise HTTPException(status_code=400, detail="storage must be 'table' or 'jsonb'")
+
     image_path = None
     image_url = None
 
     if image:
-        validate_image(image)
-        unique_filename = generate_unique_filename(image.filename)
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        with open(file_path, "wb") as f:
-            f.write(await image.read())
-        image_path = f"/static/images/{unique_filename}"
-        image_url = f"/api/files/images/{unique_filename}"
+        filename = await save_image(image)
+        image_path = f"/static/images/{filename}"
+        image_url = f"/api/files/images/{filename}"
 
     db_product = Product(
         name=name,
         description=description,
         manufacturer=manufacturer,
         image=image_path,
-        image_url=image_url
+        image_url=image_url,
+        storage=storage
     )
     db.add(db_product)
     await db.commit()
@@ -89,14 +66,83 @@ async def create_product(
     return db_product
 
 
-@router.get("/", response_model=list[ProductResponse], description="Выведение всей продукции из БД.")
-async def get_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Product).offset(skip).limit(limit))
-    return result.scalars().all()
+# Поля, которые можно запросить в ?fields=; id и created_at нужны для курсора и выбираются всегда
+PRODUCT_FIELDS = ("id", "name", "description", "manufacturer", "image", "image_url", "storage", "created_at")
+
+
+@router.get("/", response_model=list[ProductResponse], description="Выведение всей продукции из БД.",
+            dependencies=[Depends(admit("read"))])
+async def get_products(
+        response: Response,
+        skip: int = 0,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        manufacturer: Optional[str] = None,
+        name_prefix: Optional[str] = Query(None, description="Префикс названия (без учёта регистра)"),
+        fields: Optional[str] = Query(None, description="Список полей через запятую, например id,name"),
+        raw: bool = Query(False, description="Отдать строки без повторной валидации через ProductResponse"),
+        db: AsyncSession = Depends(get_db)
+):
+    selected = PRODUCT_FIELDS
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(requested) - set(PRODUCT_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        selected = tuple(dict.fromkeys(["id", "created_at", *requested]))
+
+    query = select(*(getattr(Product, f) for f in selected))
+    if manufacturer is not None:
+        query = query.where(Product.manufacturer == manufacturer)
+    if name_prefix:
+        # lower() на стороне БД — так же, как в индексе ix_products_name_lower_prefix
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(func.lower(Product.name).like(func.lower(f"{escaped}%")))
+
+    # Keyset-пагинация: страница начинается сразу после (created_at, id) последней строки предыдущей
+    if cursor is not None:
+        try:
+            created_at, last_id = decode_cursor(cursor, str, int)
+            created_at = datetime.fromisoformat(created_at)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Product.created_at, Product.id) > tuple_(created_at, last_id))
+    elif skip:
+        query = query.offset(skip)
+
+    query = query.order_by(Product.created_at, Product.id).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
+
+    if fields:
+        # Проекция: отдаём только запрошенные поля, минуя ProductResponse
+        payload = [{f: row._mapping[f] for f in requested} for row in rows]
+        return ORJSONResponse(payload, headers=headers)
+    if raw:
+        return ORJSONResponse([dict(row._mapping) for row in rows], headers=headers)
+    response.headers.update(headers)
+    return [dict(row._mapping) for row in rows]
+
+
+@router.get("/autocomplete", description="Автодополнение названий товаров или производителей.",
+            dependencies=[Depends(admit("read"))])
+async def autocomplete(
+        q: str = Query(..., min_length=1, max_length=100),
+        field: str = Query("name", pattern="^(name|manufacturer)$"),
+        mode: str = Query("prefix", pattern="^(prefix|fuzzy)$"),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_db)
+):
+    return await autocomplete_products(db, field, q, mode, limit)
 
 
 @router.get("/{product_id}", response_model=ProductResponse,
-            description="Выведение вариации всех параметров товара по его {ID}.")
+            description="Выведение вариации всех параметров товара по его {ID}.",
+            dependencies=[Depends(admit("read"))])
 async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Product).where(Product.id == product_id))
     product = result.scalar_one_or_none()
@@ -105,6 +151,51 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
     return product
 
 
+@router.get("/{product_id}/snapshot", response_model=ProductSnapshot,
+            description="Товар, его параметры и уникальные значения всех параметров одним ответом.",
+            dependencies=[Depends(admit("read"))])
+async def get_product_snapshot(product_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    generation = snapshot_cache.generation(product_id)
+    version = await get_product_version(db, product_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    etag = make_etag(product_id, version.version, "snapshot")
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified_response(etag, version.updated_at)
+    headers = cache_headers(etag, version.updated_at)
+
+    content = snapshot_cache.get(product_id, version.version)
+    if content is None:
+        # Товар и параметры (selectinload) — 2 запроса, колонки таблицы — 1, значения — 1
+        result = await db.execute(
+            select(Product).options(selectinload(Product.parameters)).where(Product.id == product_id)
+        )
+        product = result.scalar_one_or_none()
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+        columns = await get_param_columns(db, storage)
+        values = await get_distinct_values(db, storage, list(columns.values()))
+
+        snapshot = ProductSnapshot(
+            product=ProductResponse.model_validate(product),
+            version=version.version,
+            parameters=[
+                ParameterSnapshot(
+                    **ParameterSchemaResponse.model_validate(param).model_dump(),
+                    values=values.get(columns.get(param.id)) if param.id in columns else None
+                )
+                for param in product.parameters
+            ]
+        )
+        content = snapshot.model_dump_json().encode()
+        snapshot_cache.set(product_id, version.version, content, generation)
+
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
 @router.put("/{product_id}", response_model=ProductResponse, description="Запрос на изменение товара.")
 async def edit_product(data: ProductUpdate = Body(...), db: AsyncSession = Depends(get_db)):
     result = await db.execute(
@@ -118,6 +209,27 @@ async def edit_product(data: ProductUpdate = Body(...), db: AsyncSession = Depen
     product.name = data.name
     product.description = data.description
     product.params = data.params
+    # Поля продукта входят в снимок — его ETag и кэш должны смениться
+    await bump_version(db, product.id)
+    await publish(db, product.id, "products", "product")
+    await db.commit()
+    await db.refresh(product)
+    return product
+
+
+@router.put("/{product_id}/image", response_model=ProductResponse, description="Замена изображения товара.")
+async def upload_product_image(product_id: int, image: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Product).where(Product.id == product_id))
+    product = result.scalar_one_or_none()
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    filename = await save_image(image)
+    product.image = f"/static/images/{filename}"
+    product.image_url = f"/api/files/images/{filename}"
+    await bump_version(db, product.id)
+    await publish(db, product.id, "products", "product")
     await db.commit()
     await db.refresh(product)
     return product
@@ -131,6 +243,8 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     if product is None:
         return HTTPException(status_code=404, detail="Product not found")
 
+    await get_storage(product_id, product.name, product.storage, product.unique_rows).drop(db)
     await db.delete(product)
+    await publish(db, product_id, "products", "product")
     await db.commit()
     return product
@@ -1,355 +1,243 @@
 # app/products/router/tables.py
-import os
-import tempfile
+import hashlib
+import json
 from typing import Optional
 
-from fastapi.responses import FileResponse
-from fastapi import APIRouter, Depends, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request
 from fastapi import UploadFile
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-import pandas as pd
-
-from ..model.database import get_db
-from ..utils.db_utils import create_table
-from ..utils.router_utils import to_sql_name_kir, to_sql_name_lat
+from ..model.database import AsyncSessionLocal, get_db
+from ..utils.export_cache import EXPORT_ACCEL_PREFIX, export_cache
+from ..utils.file_utils import send_file
+from ..utils.import_utils import (
+    IMPORT_CONCURRENCY, import_batch, import_dataframe, list_batch_sources, resolve_batch_targets
+)
+from ..utils.column_names import display_name, get_display_names, map_headers, record_display_names
+from ..utils.search_utils import autocomplete_param_values
+from ..utils.serialization import ETAG_FORMATS, negotiate, render
+from ..utils.arrow_utils import (
+    EXPORT_FORMATS, detect_format, open_batches, stream_export, table_schema
+)
+from ..utils.admission import admit
+from ..utils.change_bus import publish
+from ..utils.event_stream import ImportProgress
+from ..utils.maintenance import needs_vacuum, relation_size, vacuum_queue
+from ..utils.row_storage import UNIQUE_ROWS_MODES, get_storage
+from ..utils.table_utils import (
+    add_param_columns, build_rows_query, get_param_columns, parse_filters, project_columns, resolve_param_column
+)
+from ..utils.value_index import apply_value_delta, get_max_row_id, rebuild_value_index
+from ..utils.version_utils import (
+    bump_version, cache_headers, get_product_version, is_not_modified, make_etag, not_modified_response
+)
 
 router = APIRouter(prefix="/tables", tags=["Tables"])
 
+ROWS_PAGE_MAX = 5000
+STREAM_BATCH_SIZE = 1000
+ARROW_BATCH_SIZE = 50_000
+
 
 # === Table Schema Endpoints ===
 
-@router.post("/upload_full_xlsx", description="Импорт всех параметров из XLSX.")
+@router.post("/upload_full_xlsx", description="Импорт всех параметров из XLSX.",
+            dependencies=[Depends(admit("import"))])
 async def import_excel(
         product_id: int,
         file: UploadFile = File(...),
         db: AsyncSession = Depends(get_db)
 ):
-    # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
-    )
-    product_name = product_result.scalar_one_or_none()
-
-    if product_name is None:
-        raise HTTPException(status_code=404, detail="Продукция не найдена")
-
-    table_name = f"{to_sql_name_lat(product_name)}_table"
-
-    await create_table(db, table_name)
+    import pandas as pd
 
     # Читаем Excel
     df = pd.read_excel(file.file)
-    df = df.where(pd.notnull(df), None)
-
-    # Получаем колонки БД (без id)
-    result = await db.execute(
-        text("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = :table_name
-              AND column_name != 'id'
-        """),
-        {"table_name": table_name}
-    )
-
-    db_columns = {row[0] for row in result.fetchall()}
-
-    # Сопоставление: транслит → оригинальное имя из Excel
-    excel_map = {
-        to_sql_name_lat(col): col
-        for col in df.columns
-        if col.lower() != "id"
-    }
-
-    common_columns = set(excel_map.keys())
+    return await import_dataframe(db, product_id, df)
 
-    if not common_columns:
-        return {"message": "Нет колонок для вставки"}
-
-    missing = common_columns - db_columns
-
-    # Создаём недостающие
-    for col in missing:
-        await db.execute(
-            text(f'ALTER TABLE {table_name} ADD COLUMN "{col}" TEXT')
-        )
-        await db.execute(
-            text("""
-                            INSERT INTO parameter_schemas (name, type, table_name, product_id)
-                            SELECT
-                            CAST(:name AS VARCHAR),
-                            'Table',
-                            CAST(:table_name AS VARCHAR),
-                            :product_id
-                            WHERE NOT EXISTS (
-                                SELECT 1
-                                FROM parameter_schemas
-                                WHERE name = :name
-                                  AND product_id = :product_id
-                            )
-                        """),
-            {
-                "name": col,
-                "table_name": product_name,
-                "product_id": product_id
-            }
-        )
-
-    await db.commit()
-
-    # Формируем INSERT
-    columns_sql = ", ".join(common_columns)
-    values_sql = ", ".join(f":{col}" for col in common_columns)
-
-    insert_sql = text(f"""
-        INSERT INTO {table_name} ({columns_sql})
-        VALUES ({values_sql})
-    """)
-
-    # Вставляем строки
-    for _, row in df.iterrows():
-        values = {
-            col: str(row[excel_map[col]]) if row[excel_map[col]] is not None else None
-            for col in common_columns
-        }
-        await db.execute(insert_sql, values)
-
-    await db.commit()
-
-    return {
-        "table": table_name,
-        "inserted_rows": len(df),
-        "used_columns": list(common_columns)
-    }
 
-
-@router.post("/upload_matched_params_xlsx", description="Импорт параметров из XLSX, которые уже есть в базе данных.")
+@router.post("/upload_matched_params_xlsx", description="Импорт параметров из XLSX, которые уже есть в базе данных.",
+            dependencies=[Depends(admit("import"))])
 async def import_excel(
         product_id: int,
         file: UploadFile = File(...),
         db: AsyncSession = Depends(get_db)
 ):
-    # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
-    )
-    product_name = product_result.scalar_one_or_none()
-
-    if product_name is None:
-        raise HTTPException(status_code=404, detail="Продукция не найдена")
-
-    table_name = f"{to_sql_name_lat(product_name)}_table"
-
-    await create_table(db, table_name)
+    import pandas as pd
 
     # Читаем Excel
     df = pd.read_excel(file.file)
-    df = df.where(pd.notnull(df), None)
-
-    # Получаем колонки БД (без id)
-    result = await db.execute(
-        text("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = :table_name
-              AND column_name != 'id'
-        """),
-        {"table_name": table_name}
-    )
-    db_columns = {row[0] for row in result.fetchall()}
-
-    # Сопоставление: транслит → оригинальное имя из Excel
-    excel_map = {
-        to_sql_name_lat(col): col
-        for col in df.columns
-    }
-
-    # Пересечение
-    common_columns = db_columns & excel_map.keys()
+    return await import_dataframe(db, product_id, df, matched_only=True)
 
-    if not common_columns:
-        return {"message": "Нет совпадающих колонок"}
-
-    # Формируем INSERT
-    columns_sql = ", ".join(common_columns)
-    values_sql = ", ".join(f":{col}" for col in common_columns)
-
-    insert_sql = text(f"""
-        INSERT INTO {table_name} ({columns_sql})
-        VALUES ({values_sql})
-    """)
-
-    # Вставляем строки
-    for _, row in df.iterrows():
-        values = {
-            col: str(row[excel_map[col]]) if row[excel_map[col]] is not None else None
-            for col in common_columns
-        }
-        await db.execute(insert_sql, values)
-
-    await db.commit()
 
+@router.post("/upload_batch_xlsx", description="Пакетный импорт: книга XLSX с листом на продукт или ZIP с файлами XLSX.",
+            dependencies=[Depends(admit("import"))])
+async def import_batch_excel(
+        file: UploadFile = File(...),
+        mapping: Optional[str] = Form(None, description='JSON {"имя листа или файла": product_id}'),
+        matched_only: bool = Query(False, description="Загружать только колонки, уже существующие в БД"),
+        concurrency: int = Query(IMPORT_CONCURRENCY, ge=1, le=IMPORT_CONCURRENCY),
+        db: AsyncSession = Depends(get_db)
+):
+    try:
+        sheet_map = json.loads(mapping) if mapping else {}
+        sheet_map = {str(name): int(pid) for name, pid in sheet_map.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="mapping должен быть JSON-объектом {лист: product_id}")
+
+    content = await file.read()
+    sources, close_sources = await run_in_threadpool(list_batch_sources, content)
+    try:
+        if not sources:
+            raise HTTPException(status_code=400, detail="В файле нет листов для импорта")
+
+        targets = await resolve_batch_targets(db, [name for name, _ in sources], sheet_map)
+        # Соединение запроса больше не нужно — листы грузятся в собственных сессиях
+        await db.close()
+
+        results = await import_batch(sources, targets, matched_only, concurrency)
+    finally:
+        close_sources()
     return {
-        "table": table_name,
-        "inserted_rows": len(df),
-        "used_columns": list(common_columns)
+        "sheets": results,
+        "imported": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
     }
 
 
-@router.post("/download_xlsx", description="Выгрузка параметров из БД в XLSX.")
+@router.post("/download_xlsx", description="Выгрузка параметров из БД в XLSX.",
+            dependencies=[Depends(admit("export"))])
 async def download_xlsx(
         product_id: int,
+        request: Request,
         db: AsyncSession = Depends(get_db)
 ):
-    # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
-    )
-    product_name = product_result.scalar_one_or_none()
+    # Получаем product_name и версию данных
+    product = await get_product_version(db, product_id)
 
-    if product_name is None:
+    if product is None:
         raise HTTPException(status_code=404, detail="Продукция не найдена")
 
-    table_name = f"{to_sql_name_lat(product_name)}_table"
+    # Данные не менялись с прошлой выгрузки клиента — таблицу не читаем
+    etag = make_etag(product_id, product.version, "xlsx")
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified_response(etag, product.updated_at)
 
-    # Проверяем, что таблица существует
-    exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.tables
-                WHERE table_name = :table_name
-            )
-        """),
-        {"table_name": table_name}
-    )
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
 
-    if not exists.scalar():
-        raise HTTPException(status_code=404, detail="Table not found")
+    async def render(file_path: str):
+        # Проверяем, что таблица существует
+        if not await storage.exists(db):
+            raise HTTPException(status_code=404, detail="Table not found")
 
-    # Получаем данные таблицы
-    result = await db.execute(text(f"SELECT * FROM {table_name}"))
-    rows = result.fetchall()
-    columns = result.keys()
+        # Получаем данные таблицы
+        columns = await get_param_columns(db, storage)
+        sql, params = build_rows_query(storage, list(columns.values()), [])
+        result = await db.execute(sql, params)
+        rows = result.fetchall()
+        columns = result.keys()
 
-    if not rows:
-        raise HTTPException(status_code=400, detail="Table is empty")
+        if not rows:
+            raise HTTPException(status_code=400, detail="Table is empty")
 
-    # DataFrame
-    df = pd.DataFrame(rows, columns=columns)
+        # DataFrame
+        import pandas as pd
 
-    # Переводим названия колонок и значения с латиницы на кириллицу, кроме названия колонок из SYSTEM_COLUMNS
-    SYSTEM_COLUMNS = {"id"}
+        df = pd.DataFrame(rows, columns=columns)
 
-    df.columns = [
-        to_sql_name_kir(col) if col not in SYSTEM_COLUMNS else col
-        for col in df.columns
-    ]
-    df = df.applymap(
-        lambda x: x if isinstance(x, str) else x
-    )
+        # Возвращаем колонкам исходные имена из импорта, кроме названия колонок из SYSTEM_COLUMNS
+        SYSTEM_COLUMNS = {"id"}
+        names = await get_display_names(db, product_id)
+
+        df.columns = [
+            display_name(names, col) if col not in SYSTEM_COLUMNS else col
+            for col in df.columns
+        ]
 
-    # Создаём временный XLSX
-    tmp_dir = tempfile.gettempdir()
-    file_path = os.path.join(tmp_dir, f"{table_name}_params.xlsx")
+        # Рендер XLSX — долгая CPU-работа, выносим из event loop
+        await run_in_threadpool(df.to_excel, file_path, index=False, sheet_name="Parameters")
 
-    df.to_excel(file_path, index=False, sheet_name="Parameters")
+    # Выгрузка одной версии данных рендерится один раз и дальше отдаётся из кэша на диске
+    file_path = await export_cache.get_or_render(product_id, product.version, "xlsx", render)
 
-    # Отдаём файл
-    return FileResponse(
-        path=file_path,
-        filename=f"{table_name}_params.xlsx",
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # Отдаём файл (при EXPORT_ACCEL_PREFIX — через nginx)
+    return send_file(
+        file_path,
+        filename=f"{storage.name}_params.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=cache_headers(etag, product.updated_at),
+        accel_root=export_cache.directory,
+        accel_prefix=EXPORT_ACCEL_PREFIX
     )
 
 
-@router.get("/get_unique_param", description="Получение уникальных значений выбранного параметра из БД.")
+@router.get("/export_cache_stats", description="Статистика кэша выгрузок (попадания/промахи, размер).")
+async def export_cache_stats():
+    return export_cache.stats()
+
+
+@router.get("/get_unique_param", description="Получение уникальных значений выбранного параметра из БД.",
+            dependencies=[Depends(admit("read"))])
 async def get_unique_param(
         product_id: int,
         param_id: int,
+        request: Request,
         db: AsyncSession = Depends(get_db)
 ):
-    # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
-    )
-    product_name = product_result.scalar_one_or_none()
+    # Получаем product_name и версию данных
+    product = await get_product_version(db, product_id)
 
-    if product_name is None:
+    if product is None:
         raise HTTPException(status_code=404, detail="Продукция не найдена")
 
-    table_name = f"{to_sql_name_lat(product_name)}_table"
+    etag = make_etag(product_id, product.version, f"p{param_id}", ETAG_FORMATS[negotiate(request)])
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified_response(etag, product.updated_at)
 
-    # Получаем param_name
-    param_result = await db.execute(
-        text("""
-                SELECT name
-                FROM parameter_schemas
-                WHERE id = :param_id
-                  AND product_id = :product_id
-            """),
-        {
-            "param_id": param_id,
-            "product_id": product_id
-        }
-    )
-    param_name = param_result.scalar_one_or_none()
-
-    if param_name is None:
-        raise HTTPException(status_code=404, detail="Параметр не найден")
-
-    # Проверяем, что таблица существует
-    exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.tables
-                WHERE table_name = :table_name
-            )
-        """),
-        {"table_name": table_name}
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+
+    param_name = await resolve_param_column(db, storage, param_id)
+
+    # Получаем уникальные значения (DISTINCT на стороне БД)
+    result = await db.execute(
+        text(f"SELECT DISTINCT {storage.column(param_name)} FROM {storage.relation} WHERE {storage.scope}")
     )
+    values = [row[0] for row in result.fetchall()]
 
-    if not exists.scalar():
-        raise HTTPException(status_code=404, detail="Table not found")
+    if not values:
+        raise HTTPException(status_code=400, detail="Table is empty")
 
-    # Проверяем, что колонка существует
-    column_exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_name = :table_name
-                  AND column_name = :column_name
-            )
-        """),
-        {
-            "table_name": table_name,
-            "column_name": param_name
-        }
+    return render(
+        request,
+        {"parameter": param_name, "values": values},
+        {"values": values},
+        headers=cache_headers(etag, product.updated_at)
     )
 
-    if not column_exists.scalar():
-        raise HTTPException(status_code=404, detail="Column not found")
 
-    # Получаем данные таблицы
-    result = await db.execute(text(f"SELECT {param_name} FROM {table_name}"))
-    values = set([row[0] for row in result.fetchall()])
+@router.get("/autocomplete_param", description="Автодополнение значений параметра по префиксу или нечётко.",
+            dependencies=[Depends(admit("read"))])
+async def autocomplete_param(
+        product_id: int,
+        param_id: int,
+        q: str = Query(..., min_length=1, max_length=100),
+        mode: str = Query("prefix", pattern="^(prefix|fuzzy)$"),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
 
-    if not values:
-        raise HTTPException(status_code=400, detail="Table is empty")
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    param_name = await resolve_param_column(db, storage, param_id)
 
-    return {
-        "parameter": param_name,
-        "values": values
-    }
+    values = await autocomplete_param_values(db, product_id, param_id, q, mode, limit)
+    return {"parameter": param_name, "values": values}
 
 
 @router.post("/delete_selected_value_of_param", description="Удаление выбранного значения из параметра в БД.")
@@ -360,88 +248,37 @@ async def get_unique_param(
         db: AsyncSession = Depends(get_db)
 ):
     # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
-    )
-    product_name = product_result.scalar_one_or_none()
+    product = await get_product_version(db, product_id)
 
-    if product_name is None:
+    if product is None:
         raise HTTPException(status_code=404, detail="Продукция не найдена")
 
-    table_name = f"{to_sql_name_lat(product_name)}_table"
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
 
-    # Получаем param_name
-    param_result = await db.execute(
-        text("""
-                   SELECT name
-                   FROM parameter_schemas
-                   WHERE id = :param_id
-                     AND product_id = :product_id
-               """),
-        {
-            "param_id": param_id,
-            "product_id": product_id
-        }
-    )
-    param_name = param_result.scalar_one_or_none()
-
-    if param_name is None:
-        raise HTTPException(status_code=404, detail="Параметр не найден")
-
-    # Проверяем, что таблица существует
-    exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.tables
-                WHERE table_name = :table_name
-            )
-        """),
-        {"table_name": table_name}
-    )
-
-    if not exists.scalar():
-        raise HTTPException(status_code=404, detail="Table not found")
-
-    # Проверяем, что колонка существует
-    column_exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_name = :table_name
-                  AND column_name = :column_name
-            )
-        """),
-        {
-            "table_name": table_name,
-            "column_name": param_name
-        }
-    )
-
-    if not column_exists.scalar():
-        raise HTTPException(status_code=404, detail="Column not found")
+    param_name = await resolve_param_column(db, storage, param_id)
 
     # Удаляем данные таблицы
     if value is None:
-        delete_sql = text(f"""
-                DELETE FROM "{table_name}"
-                WHERE "{param_name}" IS NULL
-            """)
+        where_sql = f"{storage.column(param_name)} IS NULL"
         params = {}
     else:
-        delete_sql = text(f"""
-                DELETE FROM "{table_name}"
-                WHERE "{param_name}" = :value
-            """)
+        where_sql = storage.eq(param_name, "value")
         params = {"value": value}
 
+    delete_sql = text(f"""
+            DELETE FROM {storage.relation}
+            WHERE {storage.scope} AND {where_sql}
+        """)
+
+    # Счётчики индекса значений уменьшаются до удаления, пока строки ещё есть
+    await apply_value_delta(db, storage, where_sql, params, sign=-1)
     await db.execute(delete_sql, params)
+    await bump_version(db, product_id)
+    await publish(db, product_id, storage.name, "value_deleted")
     await db.commit()
 
     return {
-        "table": table_name,
+        "table": storage.name,
         "parameter": param_name,
         "deleted_value": value,
     }
@@ -455,155 +292,474 @@ async def get_unique_param(
         db: AsyncSession = Depends(get_db)
 ):
     # Получаем product_name
-    product_result = await db.execute(
-        text("SELECT name FROM products WHERE id = :id"),
-        {"id": product_id}
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    param_name = await resolve_param_column(db, storage, param_id)
+    column = storage.column(param_name)
+
+    # считаем количество записей для каждого значения
+    count_result = await db.execute(
+        text(f"""
+            SELECT {column} AS value, COUNT(*) AS cnt
+            FROM {storage.relation}
+            WHERE {storage.scope} AND {column} IS NOT NULL
+            GROUP BY {column}
+        """)
     )
-    product_name = product_result.scalar_one_or_none()
+    rows = count_result.fetchall()
 
-    if product_name is None:
+    if not rows:
+        # все значения в выбранной колонке - NULL
+        await storage.set_value(db, param_name, value)
+        await rebuild_value_index(db, storage, [param_id])
+        await bump_version(db, product_id)
+        await publish(db, product_id, storage.name, "value_added")
+        await db.commit()
+
+        return {
+            "parameter": param_name,
+            "new_value": value,
+            "mode": "updated_null_column"
+        }
+
+    # значение с максимальным количеством записей
+    max_value = max(rows, key=lambda r: r[1])[0]
+
+    # копируем строки этого значения, заменяя только param_name
+    max_id = await get_max_row_id(db, storage)
+    await storage.duplicate_rows(db, param_name, value, max_value)
+
+    await apply_value_delta(db, storage, "id > :max_id", {"max_id": max_id})
+    await bump_version(db, product_id)
+    await publish(db, product_id, storage.name, "value_added")
+    await db.commit()
+
+    return {
+        "parameter": param_name,
+        "new_value": value,
+        "copied_from": max_value,
+        "mode": "duplicated_rows"
+    }
+
+
+@router.get("/rows", description="Постраничное чтение строк таблицы продукта (keyset по id).",
+            dependencies=[Depends(admit("read"))])
+async def get_rows(
+        product_id: int,
+        request: Request,
+        after_id: int = Query(0, description="id последней строки предыдущей страницы"),
+        limit: int = Query(500, ge=1, le=ROWS_PAGE_MAX),
+        param_ids: Optional[str] = Query(None, description="Колонки: id параметров через запятую"),
+        filters: list[str] = Query(
+            [], alias="filter",
+            description="<param_id>:<op>:<value>, op: eq, ne, lt, lte, gt, gte, null, notnull"
+        ),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
         raise HTTPException(status_code=404, detail="Продукция не найдена")
 
-    table_name = f"{to_sql_name_lat(product_name)}_table"
+    query_hash = hashlib.md5(request.url.query.encode()).hexdigest()[:12]
+    etag = make_etag(product_id, product.version, "rows", query_hash, ETAG_FORMATS[negotiate(request)])
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified_response(etag, product.updated_at)
 
-    # Получаем param_name
-    param_result = await db.execute(
-        text("""
-                   SELECT name
-                   FROM parameter_schemas
-                   WHERE id = :param_id
-                     AND product_id = :product_id
-               """),
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    columns = await get_param_columns(db, storage)
+    if not columns:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    selected = project_columns(param_ids, columns)
+    sql, params = build_rows_query(storage, selected, parse_filters(filters, columns), after_id, limit)
+    result = await db.execute(sql, params)
+    keys = list(result.keys())
+    rows = result.fetchall()
+    next_after_id = rows[-1][0] if len(rows) == limit else None
+
+    headers = cache_headers(etag, product.updated_at)
+    if next_after_id is not None:
+        headers["X-Next-After-Id"] = str(next_after_id)
+
+    return render(
+        request,
         {
-            "param_id": param_id,
-            "product_id": product_id
-        }
+            "table": storage.name,
+            "columns": [{"param_id": pid, "name": name} for pid, name in columns.items() if name in selected],
+            "rows": [dict(zip(keys, row)) for row in rows],
+            "next_after_id": next_after_id,
+        },
+        {key: [row[i] for row in rows] for i, key in enumerate(keys)},
+        headers=headers
     )
-    param_name = param_result.scalar_one_or_none()
-
-    if param_name is None:
-        raise HTTPException(status_code=404, detail="Параметр не найден")
-
-    # Проверяем, что таблица существует
-    exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.tables
-                WHERE table_name = :table_name
-            )
-        """),
-        {"table_name": table_name}
+
+
+@router.get("/rows/stream", description="Потоковая выгрузка строк таблицы продукта в NDJSON.",
+            dependencies=[Depends(admit("export"))])
+async def stream_rows(
+        product_id: int,
+        param_ids: Optional[str] = Query(None, description="Колонки: id параметров через запятую"),
+        filters: list[str] = Query(
+            [], alias="filter",
+            description="<param_id>:<op>:<value>, op: eq, ne, lt, lte, gt, gte, null, notnull"
+        ),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    columns = await get_param_columns(db, storage)
+    if not columns:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    selected = project_columns(param_ids, columns)
+    sql, params = build_rows_query(storage, selected, parse_filters(filters, columns))
+
+    async def generate():
+        # Отдельная сессия живёт столько же, сколько ответ; серверный курсор читает строки пачками
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(sql, params, execution_options={"yield_per": STREAM_BATCH_SIZE})
+            keys = list(result.keys())
+            async for partition in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(keys, row)), ensure_ascii=False) + "\n" for row in partition
+                ).encode()
+
+    # Соединение запроса больше не нужно — иначе оно простаивает в транзакции, пока идёт выгрузка
+    await db.close()
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Product-Version": str(product.version)}
     )
 
-    if not exists.scalar():
+
+@router.get("/export", description="Потоковая выгрузка таблицы продукта в Parquet или Arrow IPC.",
+            dependencies=[Depends(admit("export"))])
+async def export_table(
+        product_id: int,
+        request: Request,
+        format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    etag = make_etag(product_id, product.version, format)
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified_response(etag, product.updated_at)
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    columns = await get_param_columns(db, storage)
+    if not columns:
         raise HTTPException(status_code=404, detail="Table not found")
 
-    # Проверяем, что колонка существует
-    column_exists = await db.execute(
-        text("""
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_name = :table_name
-                  AND column_name = :column_name
-            )
-        """),
-        {
-            "table_name": table_name,
-            "column_name": param_name
+    sql, params = build_rows_query(storage, list(columns.values()), [])
+    names = await get_display_names(db, product_id)
+    schema = table_schema(
+        ["id", *columns.values()],
+        metadata={
+            "product_id": str(product_id),
+            "version": str(product.version),
+            "display_names": json.dumps(
+                {col: display_name(names, col) for col in columns.values()}, ensure_ascii=False
+            ),
         }
     )
 
-    if not column_exists.scalar():
-        raise HTTPException(status_code=404, detail="Column not found")
+    async def partitions():
+        # Серверный курсор: пачки строк идут в писатель по мере чтения
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(sql, params, execution_options={"yield_per": ARROW_BATCH_SIZE})
+            async for partition in result.partitions():
+                yield partition
+
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = cache_headers(etag, product.updated_at)
+    headers["Content-Disposition"] = f'attachment; filename="{storage.name}.{extension}"'
+    await db.close()
+    return StreamingResponse(stream_export(format, schema, partitions()), media_type=media_type, headers=headers)
+
+
+@router.post("/import", description="Импорт таблицы продукта из Parquet или Arrow IPC (COPY, без построчной обработки).",
+            dependencies=[Depends(admit("import"))])
+async def import_table(
+        product_id: int,
+        matched_only: bool = Query(False, description="Загружать только колонки, уже существующие в БД"),
+        file: UploadFile = File(...),
+        db: AsyncSession = Depends(get_db)
+):
+    import pyarrow as pa
+
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    await storage.ensure(db)
+
+    try:
+        schema, batches = open_batches(file.file, detect_format(file.file), ARROW_BATCH_SIZE)
+    except (pa.ArrowInvalid, OSError):
+        raise HTTPException(status_code=400, detail="Файл не является Parquet или Arrow IPC")
+
+    # Сопоставление: sql-имя → оригинальное имя колонки файла
+    file_map = await map_headers(db, product_id, schema.names)
 
-    # Получаем данные таблицы
+    db_columns = set(await storage.list_columns(db))
+    if matched_only:
+        common_columns = [col for col in file_map if col in db_columns]
+    else:
+        common_columns = list(file_map)
+        await add_param_columns(db, storage, product.name, set(common_columns) - db_columns)
+
+    if not common_columns:
+        return {"message": "Нет колонок для вставки"}
+
+    source_columns = [file_map[col] for col in common_columns]
+
+    # COPY в той же транзакции, что и DDL
+    max_id = await get_max_row_id(db, storage)
+    with ImportProgress(product_id, source=file.filename) as progress:
+        try:
+            inserted_rows = await storage.copy_batches(db, batches, common_columns, source_columns, progress)
+        except pa.ArrowException as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось преобразовать колонки: {e}")
+
+        # Выгрузка Parquet/Arrow хранит исходные имена в метаданных схемы — восстанавливаем их
+        names = {col: file_map[col] for col in common_columns}
+        if schema.metadata and b"display_names" in schema.metadata:
+            exported = json.loads(schema.metadata[b"display_names"])
+            names.update({col: exported[col] for col in common_columns if col in exported})
+        await record_display_names(db, product_id, names)
+
+        await apply_value_delta(db, storage, "id > :max_id", {"max_id": max_id})
+        await bump_version(db, product_id)
+        await publish(db, product_id, storage.name, "import")
+        await db.commit()
+    progress.finish(table=storage.name)
+
+    return {
+        "table": storage.name,
+        "inserted_rows": inserted_rows,
+        "used_columns": common_columns
+    }
+
+
+@router.get("/search_value", description="Поиск продуктов и параметров, в которых встречается значение.",
+            dependencies=[Depends(admit("read"))])
+async def search_value(
+        value: str,
+        param_name: Optional[str] = Query(None, description="Ограничить поиск параметром (имя колонки)"),
+        limit: int = Query(100, ge=1, le=1000),
+        db: AsyncSession = Depends(get_db)
+):
+    # Индексный поиск по param_value_index вместо обхода всех таблиц продуктов
+    param_filter = "AND ps.name = :param_name" if param_name else ""
     result = await db.execute(
         text(f"""
-            SELECT "{param_name}"
-            FROM "{table_name}"
-            WHERE "{param_name}" IS NOT NULL
-        """)
+            SELECT i.product_id, p.name AS product_name,
+                   i.parameter_schema_id, ps.name AS parameter_name,
+                   i.row_count
+            FROM param_value_index i
+            JOIN products p ON p.id = i.product_id
+            JOIN parameter_schemas ps ON ps.id = i.parameter_schema_id
+            WHERE i.value = :value {param_filter}
+            ORDER BY i.row_count DESC, i.product_id
+            LIMIT :limit
+        """),
+        {"value": value, "param_name": param_name, "limit": limit}
     )
-    values = [row[0] for row in result.fetchall()]
+    return {"value": value, "matches": result.mappings().all()}
 
-    if not values:
-        # все значения в выбранной колонке - NULL
-        await db.execute(
-            text(f"""
-                UPDATE "{table_name}"
-                SET "{param_name}" = :new_value
-            """),
-            {"new_value": value}
-        )
+
+@router.post("/rebuild_value_index", description="Пересчёт индекса значений для продукта или всего каталога.",
+            dependencies=[Depends(admit("import"))])
+async def rebuild_value_index_endpoint(
+        product_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    if product_id is None:
+        result = await db.execute(text("SELECT id, name, storage FROM products ORDER BY id"))
+        products = result.fetchall()
+    else:
+        product = await get_product_version(db, product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Продукция не найдена")
+        products = [(product_id, product.name, product.storage)]
+
+    rebuilt = []
+    for pid, name, kind in products:
+        await rebuild_value_index(db, get_storage(pid, name, kind))
         await db.commit()
+        rebuilt.append(pid)
 
-        return {
-            "parameter": param_name,
-            "new_value": value,
-            "mode": "updated_null_column"
-        }
+    return {"rebuilt_products": rebuilt}
 
-    else:
-        # считаем количество записей для каждого значения
-        count_result = await db.execute(
-            text(f"""
-                    SELECT "{param_name}", COUNT(*) AS cnt
-                    FROM "{table_name}"
-                    WHERE "{param_name}" IS NOT NULL
-                    GROUP BY "{param_name}"
-                """)
-        )
-
-        rows = count_result.fetchall()
-        if not rows:
-            raise HTTPException(status_code=400, detail="No values to duplicate")
-
-        # значение с максимальным количеством записей
-        max_value = max(rows, key=lambda r: r[1])[0]
-
-        # получаем все колонки таблицы, кроме id
-        cols_result = await db.execute(
-            text("""
-                    SELECT column_name
-                    FROM information_schema.columns
-                    WHERE table_name = :table_name
-                      AND column_name != 'id'
-                """),
-            {"table_name": table_name}
-        )
-
-        columns = [r[0] for r in cols_result.fetchall()]
-
-        # формируем SELECT: заменяем только param_name
-        select_columns = []
-        for col in columns:
-            if col == param_name:
-                select_columns.append(":new_value AS " + col)
-            else:
-                select_columns.append(f'"{col}"')
-
-        insert_sql = text(f"""
-                INSERT INTO "{table_name}" ({", ".join(f'"{c}"' for c in columns)})
-                SELECT {", ".join(select_columns)}
-                FROM "{table_name}"
-                WHERE "{param_name}" = :max_value
-            """)
-
-        await db.execute(
-            insert_sql,
-            {
-                "new_value": value,
-                "max_value": max_value
-            }
-        )
 
+@router.post("/convert_storage", description="Перенос строк продукта в другое хранилище (table или jsonb).",
+            dependencies=[Depends(admit("import"))])
+async def convert_storage(
+        product_id: int,
+        storage: str = Query(..., pattern="^(table|jsonb)$"),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+    if product.storage == storage:
+        raise HTTPException(status_code=400, detail=f"Продукт уже хранится в {storage}")
+
+    source = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    target = get_storage(product_id, product.name, storage)
+    if await target.is_shared(db):
+        raise HTTPException(status_code=409, detail=f"Таблица {target.name} занята другим продуктом")
+    await target.ensure(db)
+
+    # Копирование, смена products.storage и удаление источника — одной транзакцией
+    columns = await get_param_columns(db, source, use_cache=False)
+    await target.add_columns(db, set(columns.values()) - set(await target.list_columns(db)))
+    if await source.exists(db):
+        await target.insert_from(db, source, list(columns.values()))
+        await source.drop(db)
+    if product.unique_rows:
+        target.unique_rows = product.unique_rows
+        await target.create_unique_index(db)
+
+    await db.execute(
+        text("UPDATE products SET storage = :storage WHERE id = :id"),
+        {"storage": storage, "id": product_id}
+    )
+    # id строк назначаются заново — пересчитываем индекс значений целиком
+    await rebuild_value_index(db, target)
+    await bump_version(db, product_id)
+    await publish(db, product_id, target.name, "storage")
+    await db.commit()
+
+    return {"product_id": product_id, "storage": storage, "table": target.name, "columns": list(columns.values())}
+
+
+@router.post("/index_param", description="Индекс по часто фильтруемому параметру продукта.",
+            dependencies=[Depends(admit("import"))])
+async def index_param(
+        product_id: int,
+        param_id: int,
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    param_name = await resolve_param_column(db, storage, param_id)
+
+    index = await storage.create_column_index(db, param_name)
+    await db.commit()
+
+    return {"parameter": param_name, "table": storage.name, "index": index}
+
+
+async def compact_product(db: AsyncSession, storage) -> dict:
+    # Удаление дублей в транзакции запроса; индекс значений пересчитывается по оставшимся строкам
+    rows_before = await storage.count_rows(db)
+    size_before = await relation_size(db, storage.name)
+    removed = await storage.compact(db)
+    if removed:
+        await rebuild_value_index(db, storage)
+        await bump_version(db, storage.product_id)
+        await publish(db, storage.product_id, storage.name, "compact")
+    return {
+        "product_id": storage.product_id,
+        "table": storage.name,
+        "rows_before": rows_before,
+        "removed_rows": removed,
+        "size_before_bytes": size_before,
+        # Место освобождается VACUUM; оценка — доля удалённых строк от размера таблицы
+        "reclaimable_bytes": size_before * removed // rows_before if rows_before else 0,
+    }
+
+
+@router.post("/compact", description="Удаление полных дублей строк продукта или всего каталога.",
+            dependencies=[Depends(admit("import"))])
+async def compact_rows(
+        product_id: Optional[int] = None,
+        vacuum_full: bool = Query(False, description="VACUUM FULL: вернуть место ОС (блокирует таблицу)"),
+        db: AsyncSession = Depends(get_db)
+):
+    if product_id is None:
+        result = await db.execute(text("SELECT id, name, storage, unique_rows FROM products ORDER BY id"))
+        products = result.fetchall()
+    else:
+        product = await get_product_version(db, product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Продукция не найдена")
+        products = [(product_id, product.name, product.storage, product.unique_rows)]
+
+    reports = []
+    for pid, name, kind, unique_rows in products:
+        storage = get_storage(pid, name, kind, unique_rows)
+        if not await storage.exists(db):
+            continue
+        report = await compact_product(db, storage)
         await db.commit()
 
-        return {
-            "parameter": param_name,
-            "new_value": value,
-            "copied_from": max_value,
-            "mode": "duplicated_rows"
-        }
+        # После крупного сжатия — VACUUM (ANALYZE) в фоне: место для повторного использования
+        # и свежая статистика планировщика
+        report["vacuum"] = None
+        if needs_vacuum(report["rows_before"], report["removed_rows"]):
+            vacuum_queue.schedule(storage.name, full=vacuum_full)
+            report["vacuum"] = "full" if vacuum_full else "scheduled"
+        reports.append(report)
+
+    return {
+        "products": reports,
+        "removed_rows": sum(r["removed_rows"] for r in reports),
+        "reclaimable_bytes": sum(r["reclaimable_bytes"] for r in reports),
+    }
+
+
+@router.post("/unique_rows", description="Уникальность строк продукта: дубли пропускаются (ignore) или отклоняются (reject).",
+            dependencies=[Depends(admit("import"))])
+async def set_unique_rows(
+        product_id: int,
+        mode: str = Query(..., pattern="^(ignore|reject|off)$"),
+        db: AsyncSession = Depends(get_db)
+):
+    product = await get_product_version(db, product_id)
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    unique_rows = mode if mode in UNIQUE_ROWS_MODES else None
+    storage = get_storage(product_id, product.name, product.storage, unique_rows)
+
+    report = None
+    if unique_rows is None:
+        await storage.drop_unique_index(db)
+    elif await storage.exists(db):
+        # Уникальный индекс не построится, пока в таблице есть дубли
+        report = await compact_product(db, storage)
+        await storage.create_unique_index(db)
+
+    await db.execute(
+        text("UPDATE products SET unique_rows = :mode WHERE id = :id"),
+        {"mode": unique_rows, "id": product_id}
+    )
+    await bump_version(db, product_id)
+    await publish(db, product_id, "products", "product")
+    await db.commit()
+
+    return {"product_id": product_id, "unique_rows": unique_rows, "index": storage.unique_index, "compaction": report}
@@ -1,8 +1,11 @@
 # app/products/schema/product.py
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, computed_field
+from typing import Any, Optional
 from datetime import datetime
 
+from .parameter_schema import ParameterSchemaResponse
+from ..utils.image_utils import image_variant_urls
+
 
 class ProductBase(BaseModel):
     name: str
@@ -23,7 +26,24 @@ class ProductResponse(ProductBase):
     id: int
     image: Optional[str] = None
     image_url: Optional[str] = None
+    storage: Optional[str] = None  # "table" или "jsonb"
     created_at: datetime
 
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[dict[str, str]]:
+        # URL уменьшенных копий изображения (thumb, preview)
+        return image_variant_urls(self.image_url)
+
     class Config:
         from_attributes = True
+
+
+class ParameterSnapshot(ParameterSchemaResponse):
+    values: Optional[list[Any]] = None  # None — колонки параметра нет в таблице продукта
+
+
+class ProductSnapshot(BaseModel):
+    product: ProductResponse
+    version: int
+    parameters: list[ParameterSnapshot]
@@ -0,0 +1,165 @@
+# app/products/utils/admission.py
+import asyncio
+import math
+import os
+import time
+
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from starlette.routing import Match
+
+# Пулы допуска: имя -> (одновременно выполняется, ждут в очереди).
+# Формат переменной: "import=2:4,export=2:8,read=32:128"
+DEFAULT_POOLS = "import=2:4,export=2:8,read=32:128"
+ADMISSION_WAIT_TIMEOUT = float(os.getenv("ADMISSION_WAIT_TIMEOUT", "10"))
+
+
+class AdmissionPool:
+    # Ограничение параллельных запросов одного класса: сверх limit запросы ждут в очереди
+    # не дольше wait_timeout (иначе 503), при полной очереди сразу получают 429.
+    # Retry-After оценивается по средней длительности запроса в пуле.
+    def __init__(self, name: str, limit: int, max_queue: int, wait_timeout: float = ADMISSION_WAIT_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.avg_duration = 1.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def retry_after(self) -> int:
+        # Сколько ждать, пока освободятся слоты для всей очереди
+        rounds = (self.waiting + self.active) / self.limit
+        return max(1, math.ceil(rounds * self.avg_duration))
+
+    def reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise self.reject(429, f"Слишком много запросов в пуле {self.name}")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise self.reject(503, f"Пул {self.name} перегружен")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+
+    def release(self, duration: float) -> None:
+        self.active -= 1
+        self.avg_duration = 0.9 * self.avg_duration + 0.1 * duration
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_duration_s": round(self.avg_duration, 3),
+        }
+
+
+def parse_pools(spec: str) -> dict[str, AdmissionPool]:
+    pools = {}
+    for item in spec.split(","):
+        name, _, limits = item.strip().partition("=")
+        limit, _, max_queue = limits.partition(":")
+        pools[name] = AdmissionPool(name, int(limit), int(max_queue or 0))
+    return pools
+
+
+admission_pools = parse_pools(os.getenv("ADMISSION_POOLS", DEFAULT_POOLS))
+
+
+def admit(pool_name: str):
+    # Зависимость FastAPI: помечает маршрут пулом допуска. Слот занимает AdmissionMiddleware
+    # ещё до чтения тела запроса; без middleware слот занимается здесь, уже после разбора тела.
+    # Освобождается после отправки ответа (для потоковых ответов — после последнего байта)
+    pool = admission_pools[pool_name]
+
+    async def dependency(request: Request):
+        if request.scope.get("admission") is not None:
+            yield
+            return
+        await pool.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            pool.release(time.perf_counter() - started)
+
+    dependency.admission_pool = pool_name
+    return dependency
+
+
+def route_pool(route) -> str | None:
+    for depends in getattr(route, "dependencies", ()):
+        pool_name = getattr(depends.dependency, "admission_pool", None)
+        if pool_name is not None:
+            return pool_name
+    return None
+
+
+class AdmissionMiddleware:
+    # Допуск до маршрутизации FastAPI: иначе multipart-тело импорта (сотни МБ) успевает
+    # принять и сохранить во временный файл ещё до отказа 429/503
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _pool_for(self, scope) -> AdmissionPool | None:
+        if self._routes is None:
+            # Маршруты подключаются после создания middleware — собираем при первом запросе
+            self._routes = [
+                (route, pool_name) for route in scope["app"].router.routes
+                if (pool_name := route_pool(route)) is not None
+            ]
+        for route, pool_name in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return admission_pools[pool_name]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        pool = self._pool_for(scope) if scope["type"] == "http" else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await pool.acquire()
+        except HTTPException as e:
+            response = ORJSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        scope["admission"] = pool.name
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.perf_counter() - started)
+
+
+def admission_stats() -> dict:
+    return {name: pool.stats() for name, pool in admission_pools.items()}
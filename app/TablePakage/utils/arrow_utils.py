@@ -0,0 +1,151 @@
+# app/products/utils/arrow_utils.py
+# pyarrow импортируется в функциях: он нужен только выгрузке и импорту Parquet/Arrow,
+# а на старте воркера стоит сотни миллисекунд
+import csv
+import io
+import json
+from typing import TYPE_CHECKING
+
+from fastapi.concurrency import run_in_threadpool
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+
+EXPORT_FORMATS = {
+    "parquet": (PARQUET_MEDIA_TYPE, "parquet"),
+    "arrow": (ARROW_FILE_MEDIA_TYPE, "arrow"),
+}
+
+
+class DrainSink(io.RawIOBase):
+    # Файловый объект для писателей pyarrow: накопленные байты забираются через drain()
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def table_schema(columns: list[str], metadata: dict | None = None) -> "pa.Schema":
+    import pyarrow as pa
+
+    # id — int64, параметры в таблицах продуктов хранятся как TEXT
+    fields = [pa.field(name, pa.int64() if name == "id" else pa.string()) for name in columns]
+    return pa.schema(fields, metadata=metadata)
+
+
+def rows_to_batch(schema: "pa.Schema", rows) -> "pa.RecordBatch":
+    # Пачка строк курсора -> колонки Arrow
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def open_writer(fmt: str, sink: DrainSink, schema: "pa.Schema"):
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    return pa_ipc.new_file(sink, schema)
+
+
+def write_partition(fmt: str, writer, sink: DrainSink, schema: "pa.Schema", rows) -> bytes:
+    # Сборка колонок и кодирование (zstd для Parquet) — CPU-работа, вызывается в пуле потоков
+    batch = rows_to_batch(schema, rows)
+    if fmt == "parquet":
+        writer.write_batch(batch)
+    else:
+        writer.write(batch)
+    return sink.drain()
+
+
+async def stream_export(fmt: str, schema: "pa.Schema", partitions):
+    # partitions — асинхронный итератор пачек строк серверного курсора;
+    # каждая пачка сразу пишется row group-ой / record batch-ем и отдаётся клиенту.
+    # В event loop остаются только чтение из БД и отдача байтов
+    sink = DrainSink()
+    writer = await run_in_threadpool(open_writer, fmt, sink, schema)
+    try:
+        async for rows in partitions:
+            data = await run_in_threadpool(write_partition, fmt, writer, sink, schema, rows)
+            if data:
+                yield data
+    finally:
+        await run_in_threadpool(writer.close)
+    yield sink.drain()
+
+
+def detect_format(file) -> str:
+    # Parquet начинается с PAR1, файл Arrow IPC — с ARROW1, иначе считаем потоковым IPC
+    head = file.read(6)
+    file.seek(0)
+    if head[:4] == b"PAR1":
+        return "parquet"
+    if head == b"ARROW1":
+        return "arrow"
+    return "arrow_stream"
+
+
+def open_batches(file, fmt: str, batch_size: int):
+    # -> (схема, итератор RecordBatch); файл читается пачками, без материализации всей таблицы
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        parquet = pq.ParquetFile(file)
+        return parquet.schema_arrow, parquet.iter_batches(batch_size=batch_size)
+    if fmt == "arrow":
+        reader = pa_ipc.open_file(file)
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    reader = pa_ipc.open_stream(file)
+    return reader.schema, iter(reader)
+
+
+def batch_to_csv(batch: "pa.RecordBatch", source_columns: list[str]) -> bytes:
+    # Колонки приводятся к строкам векторно; NULL пишется пустым значением без кавычек,
+    # пустая строка — в кавычках, так COPY ... CSV различает их
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    arrays = [batch.column(name).cast(pa.string()) for name in source_columns]
+    table = pa.Table.from_arrays(arrays, names=[f"c{i}" for i in range(len(arrays))])
+    out = io.BytesIO()
+    pa_csv.write_csv(table, out, pa_csv.WriteOptions(include_header=False, quoting_style="all_valid"))
+    return out.getvalue()
+
+
+def batch_to_json_csv(batch: "pa.RecordBatch", source_columns: list[str], columns: list[str], product_id: int) -> bytes:
+    # Строки пачки -> CSV (product_id, data) для COPY в product_rows; NULL в data не пишутся
+    import pyarrow as pa
+
+    values = [batch.column(name).cast(pa.string()).to_pylist() for name in source_columns]
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in zip(*values):
+        data = {col: value for col, value in zip(columns, row) if value is not None}
+        writer.writerow((product_id, json.dumps(data, ensure_ascii=False)))
+    return out.getvalue().encode()
@@ -0,0 +1,68 @@
+# app/products/utils/cache_utils.py
+from collections import OrderedDict
+
+
+class ProductCache:
+    # Кэш в памяти воркера, сгруппированный по продуктам: инвалидация по product_id
+    # удаляет только записи этого продукта. Пока шина изменений не подключена,
+    # кэш выключен — иначе записи других воркеров оставили бы его устаревшим.
+    # Поколение продукта растёт при каждой инвалидации: значение, прочитанное из БД
+    # до инвалидации (например, до commit изменения), в кэш не попадает
+    def __init__(self, name: str, max_products: int = 1000):
+        self.name = name
+        self.max_products = max_products
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self.stale_writes = 0
+        self._data: OrderedDict[int, dict] = OrderedDict()
+        self._epoch = 0
+        self._generations: dict[int, int] = {}
+
+    def generation(self, product_id: int) -> tuple[int, int]:
+        # Берётся до чтения из БД и передаётся в set()
+        return self._epoch, self._generations.get(product_id, 0)
+
+    def get(self, product_id: int, key, default=None):
+        entries = self._data.get(product_id) if self.enabled else None
+        if entries is None or key not in entries:
+            self.misses += 1
+            return default
+        self._data.move_to_end(product_id)
+        self.hits += 1
+        return entries[key]
+
+    def set(self, product_id: int, key, value, generation: tuple[int, int]) -> None:
+        if not self.enabled:
+            return
+        if generation != self.generation(product_id):
+            self.stale_writes += 1
+            return
+        self._data.setdefault(product_id, {})[key] = value
+        self._data.move_to_end(product_id)
+        while len(self._data) > self.max_products:
+            self._data.popitem(last=False)
+
+    def invalidate(self, product_id: int | None = None) -> None:
+        if product_id is None:
+            self._epoch += 1
+            self._data.clear()
+        else:
+            self._generations[product_id] = self._generations.get(product_id, 0) + 1
+            self._data.pop(product_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "products": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_writes": self.stale_writes,
+        }
+
+
+# Имя продукта, версия данных, имена колонок параметров
+metadata_cache = ProductCache("metadata")
+
+# Готовые JSON-снимки продукта (product + параметры + значения) по версии данных
+snapshot_cache = ProductCache("snapshot", max_products=200)
@@ -0,0 +1,164 @@
+# app/products/utils/change_bus.py
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.database import engine
+from .cache_utils import ProductCache, metadata_cache, snapshot_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "agr_changes"
+# Ход импорта: не транзакционный (отправляется сразу) и кэши не сбрасывает
+PROGRESS_CHANNEL = "agr_progress"
+CHANGE_BUS_ENABLED = os.getenv("CHANGE_BUS_ENABLED", "true").lower() in ("1", "true", "yes")
+RECONNECT_DELAY = 5
+
+# Идентификатор воркера — отличает собственные уведомления от чужих
+WORKER_ID = uuid.uuid4().hex[:12]
+
+
+async def publish(db: AsyncSession, product_id: int | None, table: str, kind: str) -> None:
+    # NOTIFY транзакционный: уведомление уйдёт слушателям только после commit
+    payload = {"product_id": product_id, "table": table, "kind": kind, "origin": WORKER_ID}
+    await db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": json.dumps(payload)}
+    )
+    # Свой воркер сбрасывает кэши сразу, не дожидаясь собственного уведомления. Чтения, начатые
+    # до commit, могут записать старое значение и после этого — их отбрасывает повторная
+    # инвалидация по собственному уведомлению, которая меняет поколение продукта в кэше
+    for cache in change_bus.caches:
+        cache.invalidate(product_id)
+
+
+class ChangeBus:
+    # Одно LISTEN-соединение на воркер: получает события изменений от всех воркеров
+    # и контейнеров и вытесняет из зарегистрированных кэшей записи затронутых продуктов
+    def __init__(self):
+        self.caches: list[ProductCache] = []
+        self.handlers = []
+        self.received = 0
+        self._task = None
+        self._connected = asyncio.Event()
+        self._connection = None
+        self._notify_lock = asyncio.Lock()
+        self._pending = set()
+
+    def register_cache(self, cache: ProductCache) -> None:
+        self.caches.append(cache)
+
+    def add_handler(self, handler) -> None:
+        # handler(event: dict, channel: str) — вызывается для каждого события изменений и хода импорта
+        self.handlers.append(handler)
+
+    def _set_caches_enabled(self, enabled: bool) -> None:
+        # Пока соединения нет, события могут теряться — кэши сбрасываются и выключаются
+        for cache in self.caches:
+            cache.invalidate()
+            cache.enabled = enabled
+
+    def dispatch(self, event: dict, channel: str = CHANNEL) -> None:
+        self.received += 1
+        if channel == CHANNEL:
+            product_id = event.get("product_id")
+            for cache in self.caches:
+                cache.invalidate(product_id)
+        for handler in self.handlers:
+            try:
+                handler(event, channel)
+            except Exception:
+                logger.exception("Ошибка обработчика события изменений")
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Некорректное событие изменений: %s", payload)
+            return
+        self.dispatch(event, channel)
+
+    async def notify(self, channel: str, event: dict) -> None:
+        # Вне транзакций запросов — через соединение шины; без шины событие получает только свой воркер
+        event = {**event, "origin": WORKER_ID}
+        if self._connection is None:
+            self.dispatch(event, channel)
+            return
+        try:
+            async with self._notify_lock:
+                await self._connection.execute("SELECT pg_notify($1, $2)", channel, json.dumps(event))
+        except Exception:
+            logger.warning("Не удалось отправить событие в канал %s", channel, exc_info=True)
+
+    def send(self, channel: str, event: dict) -> None:
+        # notify() без ожидания — для вызова из синхронного кода внутри event loop
+        task = asyncio.get_running_loop().create_task(self.notify(channel, event))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _listen(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            closed = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notification)
+                await connection.add_listener(PROGRESS_CHANNEL, self._on_notification)
+                self._connection = connection
+                self._set_caches_enabled(True)
+                self._connected.set()
+                logger.info("Шина изменений подключена (канал %s, воркер %s)", CHANNEL, WORKER_ID)
+                await closed.wait()
+                logger.warning("Соединение шины изменений потеряно")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Не удалось подключить шину изменений")
+            finally:
+                self._connection = None
+                self._connected.clear()
+                self._set_caches_enabled(False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def start(self, timeout: float = 5) -> None:
+        if not CHANGE_BUS_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            # Приложение работает и без шины, просто без кэшей
+            logger.warning("Шина изменений не подключилась за %s с, кэши выключены", timeout)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._connected.is_set(),
+            "worker_id": WORKER_ID,
+            "received": self.received,
+            "caches": {cache.name: cache.stats() for cache in self.caches},
+        }
+
+
+change_bus = ChangeBus()
+change_bus.register_cache(metadata_cache)
+change_bus.register_cache(snapshot_cache)
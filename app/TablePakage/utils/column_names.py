@@ -0,0 +1,63 @@
+# app/products/utils/column_names.py
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.column_name import ColumnName  # noqa: F401 — регистрирует таблицу в Base.metadata
+from .cache_utils import metadata_cache
+from .router_utils import to_sql_name_kir, to_sql_name_lat
+
+
+async def get_display_names(db: AsyncSession, product_id: int) -> dict[str, str]:
+    # sql-имя колонки -> исходное имя; кэшируется до изменения продукта
+    cached = metadata_cache.get(product_id, "display_names")
+    if cached is not None:
+        return cached
+
+    generation = metadata_cache.generation(product_id)
+    result = await db.execute(
+        text("SELECT sql_name, display_name FROM column_names WHERE product_id = :product_id"),
+        {"product_id": product_id}
+    )
+    names = {row[0]: row[1] for row in result.fetchall()}
+    metadata_cache.set(product_id, "display_names", names, generation)
+    return names
+
+
+def display_name(names: dict[str, str], sql_name: str) -> str:
+    # Для колонок, импортированных до появления column_names, — обратный транслит
+    return names.get(sql_name) or to_sql_name_kir(sql_name)
+
+
+async def map_headers(db: AsyncSession, product_id: int, headers) -> dict[str, str]:
+    # Заголовки файла -> {sql-имя: заголовок}; известные заголовки берутся из column_names без транслита
+    known = {display: sql for sql, display in (await get_display_names(db, product_id)).items()}
+    mapping = {}
+    for header in headers:
+        name = str(header)
+        if name.lower() == "id":
+            continue
+        mapping[known.get(name) or to_sql_name_lat(name)] = header
+    return mapping
+
+
+async def record_display_names(db: AsyncSession, product_id: int, mapping: dict[str, str]) -> None:
+    # Пишутся только новые и изменившиеся имена; вызывается в транзакции импорта
+    names = await get_display_names(db, product_id)
+    changed = [
+        {"product_id": product_id, "sql_name": sql, "display_name": str(display)}
+        for sql, display in mapping.items()
+        if sql and names.get(sql) != str(display)
+    ]
+    if not changed:
+        return
+
+    await db.execute(
+        text("""
+            INSERT INTO column_names (product_id, sql_name, display_name)
+            VALUES (:product_id, :sql_name, :display_name)
+            ON CONFLICT (product_id, sql_name) DO UPDATE
+            SET display_name = EXCLUDED.display_name
+        """),
+        changed
+    )
+    metadata_cache.invalidate(product_id)
@@ -0,0 +1,176 @@
+# app/products/utils/event_stream.py
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+from ...logging_config import request_id_var
+from .change_bus import CHANNEL, PROGRESS_CHANNEL, WORKER_ID, change_bus
+
+# Подписчик — только очередь в памяти воркера: простаивающее соединение не держит ни сессию БД,
+# ни задачу, поэтому их число ограничено лишь EVENTS_MAX_SUBSCRIBERS и лимитом файлов
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+# События, которые можно дослать переподключившемуся клиенту по Last-Event-ID
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "1024"))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Не чаще одного события хода импорта за интервал (секунды) на импорт
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "0.5"))
+
+EVENT_TYPES = {CHANNEL: "change", PROGRESS_CHANNEL: "progress"}
+
+
+class Subscriber:
+    def __init__(self, product_ids: set[int] | None):
+        self.product_ids = product_ids
+        self.queue: asyncio.Queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.dropped = 0
+
+    def wants(self, product_id) -> bool:
+        # События без продукта (например, пакетный импорт) получают все
+        return self.product_ids is None or product_id is None or product_id in self.product_ids
+
+    def put(self, message: tuple) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Медленный клиент: очередь сбрасывается, клиент перечитывает состояние целиком
+            self.dropped += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, "resync", {"reason": "overflow"}))
+
+
+class EventHub:
+    # Раздаёт события шины изменений подключённым к /api/events клиентам
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self.sent = 0
+        self.rejected = 0
+        self._seq = itertools.count(1)
+        self._recent: deque = deque(maxlen=EVENTS_REPLAY_SIZE)
+
+    def dispatch(self, event: dict, channel: str) -> None:
+        event_type = EVENT_TYPES.get(channel)
+        if event_type is None:
+            return
+        message = (f"{WORKER_ID}-{next(self._seq)}", event_type, event)
+        self._recent.append(message)
+        product_id = event.get("product_id")
+        for subscriber in self.subscribers:
+            if subscriber.wants(product_id):
+                subscriber.put(message)
+                self.sent += 1
+
+    def subscribe(self, product_ids: set[int] | None, last_event_id: str | None = None) -> Subscriber:
+        if len(self.subscribers) >= EVENTS_MAX_SUBSCRIBERS:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Слишком много подписчиков на события", headers={"Retry-After": "5"})
+        subscriber = Subscriber(product_ids)
+        if last_event_id:
+            self._replay(subscriber, last_event_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def _replay(self, subscriber: Subscriber, last_event_id: str) -> None:
+        # Id событий — "{воркер}-{номер}": после перезапуска или переподключения к другому воркеру,
+        # как и после вытеснения из буфера, пропущенное не восстановить — клиент перечитывает состояние
+        ids = [message[0] for message in self._recent]
+        if last_event_id not in ids:
+            subscriber.put((None, "resync", {"reason": "replay"}))
+            return
+        for message in itertools.islice(self._recent, ids.index(last_event_id) + 1, None):
+            if subscriber.wants(message[2].get("product_id")):
+                subscriber.put(message)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    async def stream(self, subscriber: Subscriber, request):
+        yield f"retry: {int(EVENTS_HEARTBEAT * 1000)}\n\n"
+        try:
+            while True:
+                try:
+                    event_id, event_type, event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение через прокси и выявляет ушедших клиентов
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield format_event(event_id, event_type, event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "max_subscribers": EVENTS_MAX_SUBSCRIBERS,
+            "sent": self.sent,
+            "rejected": self.rejected,
+            "dropped": sum(subscriber.dropped for subscriber in self.subscribers),
+        }
+
+
+def format_event(event_id: str | None, event_type: str, event: dict) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ImportProgress:
+    # Ход импорта продукта: started -> loading ... -> done | failed.
+    # request_id (X-Request-ID) позволяет клиенту узнать свой импорт среди чужих
+    def __init__(self, product_id: int | None, total: int | None = None, source: str | None = None):
+        self.product_id = product_id
+        self.total = total
+        self.source = source
+        self.rows = 0
+        self.request_id = request_id_var.get()
+        self._started = time.perf_counter()
+        self._sent_at = 0.0
+
+    def _send(self, stage: str, **extra) -> None:
+        elapsed = time.perf_counter() - self._started
+        change_bus.send(PROGRESS_CHANNEL, {
+            "product_id": self.product_id,
+            "stage": stage,
+            "source": self.source,
+            "rows": self.rows,
+            "total": self.total,
+            "rate": round(self.rows / elapsed) if elapsed > 0 else None,
+            "elapsed_ms": round(elapsed * 1000),
+            "request_id": self.request_id,
+            **extra,
+        })
+
+    def __enter__(self) -> "ImportProgress":
+        self._send("started")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # done отправляет вызывающий после commit; здесь — только неудачный импорт
+        if exc is not None:
+            self.fail(getattr(exc, "detail", None) or exc_type.__name__)
+
+    def advance(self, rows: int) -> None:
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._sent_at >= PROGRESS_INTERVAL:
+            self._sent_at = now
+            self._send("loading")
+
+    def finish(self, **extra) -> None:
+        self._send("done", **extra)
+
+    def fail(self, detail) -> None:
+        self._send("failed", detail=detail)
+
+
+event_hub = EventHub()
+change_bus.add_handler(event_hub.dispatch)
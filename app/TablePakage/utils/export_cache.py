@@ -0,0 +1,127 @@
+# app/products/utils/export_cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "agr_export_cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# internal-location nginx, смотрящий на EXPORT_CACHE_DIR; если задан, готовые выгрузки отдаёт nginx
+EXPORT_ACCEL_PREFIX = os.getenv("EXPORT_ACCEL_PREFIX", "")
+
+
+class ExportCache:
+    # Отрендеренные выгрузки на диске: один файл на (продукт, версия данных, формат).
+    # Имя файла — хэш ключа, поэтому разные продукты и воркеры не пересекаются,
+    # а вытеснение идёт по времени последнего обращения (LRU по mtime).
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def path_for(self, product_id: int, version: int, fmt: str) -> str:
+        digest = hashlib.sha256(f"{product_id}:{version}:{fmt}".encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"p{product_id}_{digest}.{fmt}")
+
+    async def get_or_render(self, product_id: int, version: int, fmt: str, render) -> str:
+        # render(path) — корутина, записывающая файл выгрузки по указанному пути
+        path = self.path_for(product_id, version, fmt)
+        if self._touch(path):
+            self.hits += 1
+            return path
+
+        # Одновременные запросы одной выгрузки рендерят её один раз
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            if self._touch(path):
+                self.hits += 1
+                return path
+
+            self.misses += 1
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.{fmt}")
+            try:
+                await render(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self._locks.pop(path, None)
+
+        await asyncio.to_thread(self._evict, product_id, fmt, path)
+        return path
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _files(self) -> list[tuple[str, str, int, float]]:
+        # (путь, имя, размер, mtime); файлы могут исчезать — их удаляют другие воркеры
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((entry.path, entry.name, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self, product_id: int, fmt: str, keep: str) -> None:
+        prefix, suffix = f"p{product_id}_", f".{fmt}"
+        files = []
+        for path, name, size, mtime in self._files():
+            # Выгрузки прежних версий этого продукта больше никогда не будут запрошены
+            if name.startswith(prefix) and name.endswith(suffix) and path != keep:
+                self._remove(path)
+            else:
+                files.append((path, size, mtime))
+
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in sorted(files, key=lambda f: f[2]):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= size
+            self._remove(path)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+            self.evictions += 1
+            logger.debug("Выгрузка вытеснена из кэша: %s", path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        files = self._files()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else 0.0,
+            "evictions": self.evictions,
+            "files": len(files),
+            "bytes": sum(size for _, _, size, _ in files),
+            "max_bytes": self.max_bytes,
+        }
+
+
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES)
@@ -0,0 +1,38 @@
+# app/products/utils/file_utils.py
+import os
+from urllib.parse import quote
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+
+def content_disposition(filename: str) -> str:
+    # Как в FileResponse: не-ASCII имена — через filename*
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def send_file(
+        path: str,
+        filename: str,
+        media_type: str,
+        headers: dict | None = None,
+        accel_root: str | None = None,
+        accel_prefix: str | None = None
+) -> Response:
+    # С accel_prefix файл отдаёт nginx (X-Accel-Redirect на internal-location, смотрящий на accel_root),
+    # воркер возвращает только заголовки; без него — FileResponse
+    if not accel_prefix:
+        return FileResponse(path=path, filename=filename, media_type=media_type, headers=headers)
+
+    relative = os.path.relpath(path, accel_root)
+    return Response(
+        media_type=media_type,
+        headers={
+            **(headers or {}),
+            "Content-Disposition": content_disposition(filename),
+            "X-Accel-Redirect": accel_prefix.rstrip("/") + "/" + quote(relative),
+        }
+    )
@@ -0,0 +1,141 @@
+# app/products/utils/image_utils.py
+import asyncio
+import hashlib
+import imghdr
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "./static/images"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Настройки
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 МБ
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
+CHUNK_SIZE = 256 * 1024
+
+# Уменьшенные копии: имя варианта -> максимальная сторона, px. Лежат в UPLOAD_DIR/<вариант>/<хэш>.webp
+IMAGE_VARIANTS = {"thumb": 200, "preview": 800}
+
+# Pillow отпускает GIL на декодировании и ресайзе, поэтому хватает потоков;
+# отдельный пул, чтобы тяжёлые картинки не занимали общий threadpool запросов
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+# Расширение файла по типу из imghdr — одинаковые картинки с .jpeg и .jpg дают один файл
+IMAGE_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "gif": ".gif"}
+
+HASHED_NAME = re.compile(r"^([0-9a-f]{64})\.\w+$")
+
+
+def check_image_header(ext: str, head: bytes) -> str:
+    # Проверка содержимого по первым байтам; -> расширение итогового файла
+    img_type = imghdr.what(None, h=head)
+    if not img_type:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    if img_type not in IMAGE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+    if ext in (".jpg", ".jpeg") and img_type != "jpeg":
+        raise HTTPException(status_code=400, detail="File extension does not match content")
+    return IMAGE_EXTENSIONS[img_type]
+
+
+def make_variants(source_path: str, digest: str) -> None:
+    # Выполняется в пуле потоков _image_executor
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("P", "LA", "PA") else "RGB")
+        for variant, size in IMAGE_VARIANTS.items():
+            directory = os.path.join(UPLOAD_DIR, variant)
+            os.makedirs(directory, exist_ok=True)
+            copy = image.copy()
+            copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+            tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.webp")
+            copy.save(tmp_path, "WEBP", quality=80, method=4)
+            os.replace(tmp_path, os.path.join(directory, f"{digest}.webp"))
+
+
+def variants_exist(digest: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(UPLOAD_DIR, variant, f"{digest}.webp"))
+        for variant in IMAGE_VARIANTS
+    )
+
+
+async def save_image(file: UploadFile) -> str:
+    # Потоковая запись загрузки на диск с подсчётом sha256; -> имя файла "<хэш><расширение>".
+    # Одинаковые изображения хранятся один раз, уменьшенные копии создаются при первой загрузке
+    ext = Path(file.filename or "").suffix.lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid extension. Allowed: .jpg, .jpeg, .png, .gif")
+
+    tmp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.upload")
+    digest = hashlib.sha256()
+    size = 0
+    final_ext = None
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                if final_ext is None:
+                    final_ext = check_image_header(ext, chunk[:1024])
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(status_code=400, detail="File too large. Max size is 5 MB.")
+                digest.update(chunk)
+                await out.write(chunk)
+
+        if final_ext is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        hex_digest = digest.hexdigest()
+        filename = f"{hex_digest}{final_ext}"
+        file_path = os.path.join(UPLOAD_DIR, filename)
+
+        created = False
+        if await aiofiles.os.path.exists(file_path):
+            # Такое изображение уже загружено
+            if variants_exist(hex_digest):
+                return filename
+        else:
+            await aiofiles.os.replace(tmp_path, file_path)
+            created = True
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(_image_executor, make_variants, file_path, hex_digest)
+        except Exception:
+            logger.warning("Не удалось создать уменьшенные копии %s", filename, exc_info=True)
+            if created:
+                await aiofiles.os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        return filename
+    finally:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+
+
+def image_variant_urls(image_url: str | None) -> dict[str, str] | None:
+    # URL уменьшенных копий для изображений с именем-хэшем (загруженных до этого — нет)
+    if not image_url:
+        return None
+    base, _, name = image_url.rpartition("/")
+    match = HASHED_NAME.match(name)
+    if match is None:
+        return None
+    return {variant: f"{base}/{variant}/{match.group(1)}.webp" for variant in IMAGE_VARIANTS}
+
+
+def shutdown_image_pool() -> None:
+    _image_executor.shutdown(wait=False, cancel_futures=True)
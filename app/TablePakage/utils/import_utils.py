@@ -0,0 +1,204 @@
+# app/products/utils/import_utils.py
+import asyncio
+import io
+import logging
+import os
+import zipfile
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.database import AsyncSessionLocal
+from .change_bus import publish
+from .column_names import map_headers, record_display_names
+from .event_stream import ImportProgress
+from .row_storage import get_storage
+from .table_utils import add_param_columns
+from .value_index import apply_value_delta, get_max_row_id
+from .version_utils import bump_version
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Сколько листов пакетного импорта грузится одновременно (каждый — своё соединение из пула)
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+# Строки листа вставляются пачками — между ними отправляется ход импорта
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+
+
+async def import_dataframe(
+        db: AsyncSession,
+        product_id: int,
+        df: "pd.DataFrame",
+        matched_only: bool = False,
+        sheet: str | None = None
+) -> dict:
+    # Загрузка листа в хранилище продукта; matched_only — только колонки, уже существующие в БД
+    import pandas as pd
+
+    product_result = await db.execute(
+        text("SELECT name, storage, unique_rows FROM products WHERE id = :id"),
+        {"id": product_id}
+    )
+    product = product_result.one_or_none()
+
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукция не найдена")
+
+    storage = get_storage(product_id, product.name, product.storage, product.unique_rows)
+    await storage.ensure(db)
+
+    df = df.where(pd.notnull(df), None)
+    db_columns = set(await storage.list_columns(db))
+
+    # Сопоставление: sql-имя → оригинальное имя из Excel (известные заголовки — из column_names)
+    excel_map = await map_headers(db, product_id, df.columns)
+
+    if matched_only:
+        common_columns = db_columns & excel_map.keys()
+        if not common_columns:
+            return {"message": "Нет совпадающих колонок"}
+    else:
+        common_columns = set(excel_map.keys())
+        if not common_columns:
+            return {"message": "Нет колонок для вставки"}
+
+        # Создаём недостающие
+        await add_param_columns(db, storage, product.name, common_columns - db_columns)
+        await db.commit()
+
+    common_columns = list(common_columns)
+
+    max_id = await get_max_row_id(db, storage)
+
+    source = df[[excel_map[col] for col in common_columns]]
+    rows = [
+        tuple(str(value) if value is not None else None for value in row)
+        for row in source.itertuples(index=False, name=None)
+    ]
+    inserted_rows = 0
+    with ImportProgress(product_id, len(rows), sheet) as progress:
+        for start in range(0, len(rows), IMPORT_CHUNK_ROWS):
+            chunk = rows[start:start + IMPORT_CHUNK_ROWS]
+            inserted_rows += await storage.insert_rows(db, common_columns, chunk)
+            progress.advance(len(chunk))
+
+        await record_display_names(db, product_id, {col: excel_map[col] for col in common_columns})
+        await apply_value_delta(db, storage, "id > :max_id", {"max_id": max_id})
+        await bump_version(db, product_id)
+        await publish(db, product_id, storage.name, "import")
+        await db.commit()
+    progress.finish(table=storage.name)
+
+    return {
+        "table": storage.name,
+        "inserted_rows": inserted_rows,
+        "used_columns": common_columns
+    }
+
+
+def list_batch_sources(content: bytes) -> tuple[list[tuple[str, object]], object]:
+    # -> ([(имя, parse)], close), parse() читает лист в DataFrame, close() закрывает книгу после загрузки.
+    # Книга XLSX — по листу на продукт; ZIP — по файлу .xlsx на продукт (первый лист)
+    import pandas as pd
+
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Ожидается книга XLSX или ZIP-архив с файлами XLSX")
+
+    with archive:
+        names = archive.namelist()
+        if "[Content_Types].xml" in names:
+            # Книга открывается, а её общие строки разбираются один раз на все листы; сами листы
+            # читаются параллельно в задачах загрузки — в памяти не больше concurrency листов сразу
+            book = pd.ExcelFile(io.BytesIO(content), engine="openpyxl")
+            return [(sheet, lambda sheet=sheet: book.parse(sheet)) for sheet in book.sheet_names], book.close
+
+        sources = []
+        for name in names:
+            path = PurePosixPath(name)
+            if path.suffix.lower() != ".xlsx" or path.name.startswith(".") or "__MACOSX" in path.parts:
+                continue
+            data = archive.read(name)
+            sources.append((path.stem, lambda data=data: pd.read_excel(io.BytesIO(data))))
+        return sources, lambda: None
+
+
+async def resolve_batch_targets(
+        db: AsyncSession,
+        names: list[str],
+        mapping: dict[str, int]
+) -> dict[str, int | None]:
+    # Лист → product_id: явное сопоставление, затем имя листа как id, затем точное название продукции
+    targets = {}
+    by_name = []
+    for name in names:
+        if name in mapping:
+            targets[name] = mapping[name]
+        elif name.strip().isdigit():
+            targets[name] = int(name.strip())
+        else:
+            by_name.append(name)
+
+    if by_name:
+        result = await db.execute(
+            text("SELECT name, MIN(id) FROM products WHERE name = ANY(:names) GROUP BY name"),
+            {"names": by_name}
+        )
+        found = {row[0]: row[1] for row in result.fetchall()}
+        targets.update({name: found.get(name) for name in by_name})
+
+    # Несуществующие id отмечаются до запуска загрузки
+    ids = {pid for pid in targets.values() if pid is not None}
+    if ids:
+        result = await db.execute(text("SELECT id FROM products WHERE id = ANY(:ids)"), {"ids": list(ids)})
+        existing = {row[0] for row in result.fetchall()}
+        targets = {name: pid if pid in existing else None for name, pid in targets.items()}
+    return targets
+
+
+async def import_batch(
+        sources: list[tuple[str, object]],
+        targets: dict[str, int | None],
+        matched_only: bool,
+        concurrency: int
+) -> list[dict]:
+    # Листы разных продуктов грузятся параллельно, каждый в своей сессии и транзакции;
+    # листы одного продукта — по очереди, чтобы не менять одно хранилище одновременно
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [{"sheet": name, "product_id": targets.get(name)} for name, _ in sources]
+
+    groups: dict[int, list] = {}
+    for index, (name, parse) in enumerate(sources):
+        product_id = targets.get(name)
+        if product_id is None:
+            results[index].update(status="skipped", detail="Продукция для листа не найдена")
+        else:
+            groups.setdefault(product_id, []).append((index, parse))
+
+    async def load_sheet(index: int, product_id: int, parse) -> None:
+        async with semaphore:
+            try:
+                df = await run_in_threadpool(parse)
+                async with AsyncSessionLocal() as session:
+                    summary = await import_dataframe(session, product_id, df, matched_only, results[index]["sheet"])
+                results[index].update(status="ok", **summary)
+            except HTTPException as e:
+                results[index].update(status="error", detail=e.detail)
+            except Exception as e:
+                logger.exception("Ошибка пакетного импорта листа %s", results[index]["sheet"])
+                results[index].update(status="error", detail=str(e))
+
+    async def load_product(product_id: int, sheets: list) -> None:
+        for index, parse in sheets:
+            await load_sheet(index, product_id, parse)
+
+    await asyncio.gather(*(load_product(pid, sheets) for pid, sheets in groups.items()))
+    return results
@@ -0,0 +1,98 @@
+# app/products/utils/maintenance.py
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from ..model.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Сжатие, после которого таблица ставится в очередь на VACUUM (ANALYZE):
+# удалено не меньше COMPACT_VACUUM_MIN_ROWS строк или не меньше доли COMPACT_VACUUM_MIN_RATIO
+COMPACT_VACUUM_MIN_ROWS = int(os.getenv("COMPACT_VACUUM_MIN_ROWS", "10000"))
+COMPACT_VACUUM_MIN_RATIO = float(os.getenv("COMPACT_VACUUM_MIN_RATIO", "0.2"))
+
+
+def needs_vacuum(rows_before: int, removed: int) -> bool:
+    if removed <= 0:
+        return False
+    return removed >= COMPACT_VACUUM_MIN_ROWS or removed >= rows_before * COMPACT_VACUUM_MIN_RATIO
+
+
+async def relation_size(db, name: str) -> int:
+    # Таблица вместе с индексами и TOAST
+    result = await db.execute(text("SELECT COALESCE(pg_total_relation_size(to_regclass(:name)), 0)"), {"name": name})
+    return result.scalar()
+
+
+class VacuumQueue:
+    # VACUUM нельзя выполнить в транзакции запроса — таблицы обрабатываются фоновой задачей
+    # воркера по одной, чтобы несколько сжатий подряд не нагружали диск одновременно
+    def __init__(self):
+        self.pending: dict[str, bool] = {}
+        self.completed = 0
+        self.failed = 0
+        self.last: dict | None = None
+        self._task = None
+
+    def schedule(self, name: str, full: bool = False) -> None:
+        # name — таблица или секция; повторная постановка объединяется с ожидающей
+        self.pending[name] = self.pending.get(name, False) or full
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self.pending:
+            name, full = next(iter(self.pending.items()))
+            del self.pending[name]
+            try:
+                await self._vacuum(name, full)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Ошибка VACUUM %s", name)
+
+    async def _vacuum(self, name: str, full: bool) -> None:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            size_before = await relation_size(conn, name)
+            if size_before == 0:
+                return
+            started = time.perf_counter()
+            options = "FULL, ANALYZE" if full else "ANALYZE"
+            await conn.execute(text(f'VACUUM ({options}) "{name}"'))
+            size_after = await relation_size(conn, name)
+        self.last = {
+            "table": name,
+            "full": full,
+            "size_before_bytes": size_before,
+            "size_after_bytes": size_after,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info("VACUUM %s: %s -> %s байт", name, size_before, size_after)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self.pending.clear()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": list(self.pending),
+            "running": self._task is not None and not self._task.done(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "last": self.last,
+        }
+
+
+vacuum_queue = VacuumQueue()
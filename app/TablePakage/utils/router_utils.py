@@ -1,19 +1,75 @@
+import base64
+import json
 import re
-from transliterate import translit
+from functools import lru_cache
 
+_NOT_SQL_CHARS = re.compile(r"[^a-z0-9_]")
+_UNDERSCORES = re.compile(r"_+")
 
+
+@lru_cache(maxsize=None)
+def _translit_tables() -> tuple[dict, tuple, dict]:
+    # Таблицы транслитерации собираются один раз (при первом вызове) из языкового пакета
+    # transliterate "ru", поэтому результат совпадает с translit(), а имена существующих
+    # таблиц и колонок не меняются
+    from transliterate.utils import get_language_pack
+
+    pack = get_language_pack("ru")()
+
+    # Кириллица -> латиница одним str.translate: специальные правила (ё, э, ъ, ь)
+    # перекрывают многобуквенные (ж -> zh, щ -> sch), те — посимвольные
+    lat_table = {code: chr(lat) for code, lat in pack.reversed_translation_table.items()}
+    lat_table.update({ord(cyr): lat for cyr, lat in pack.reversed_pre_processor_mapping.items()})
+    lat_table.update({code: chr(lat) for code, lat in pack.reversed_specific_translation_table.items()})
+
+    # Латиница -> кириллица: многобуквенные замены идут по очереди, как в translit()
+    kir_rules = tuple(pack.pre_processor_mapping.items())
+    return lat_table, kir_rules, pack.translation_table
+
+
+@lru_cache(maxsize=8192)
 def to_sql_name_lat(name: str) -> str:
     # Замена кириллицы на латиницу транслитом
-    name = name.lower()
-    name = translit(name, "ru", reversed=True)
-    name = re.sub(r"[^a-z0-9_]", "_", name)
-    name = re.sub(r"_+", "_", name)
+    lat_table, _, _ = _translit_tables()
+    name = name.lower().translate(lat_table)
+    name = _NOT_SQL_CHARS.sub("_", name)
+    name = _UNDERSCORES.sub("_", name)
     return name.strip("_")
 
 
+@lru_cache(maxsize=8192)
 def to_sql_name_kir(name: str) -> str:
-    # Замена латиницы на кириллицу транслитом
+    # Замена латиницы на кириллицу транслитом; неоднозначно (щ, ъ/ь, ё/э) —
+    # исходные имена колонок берутся из column_names, это запасной вариант
+    _, kir_rules, kir_table = _translit_tables()
     name = name.lower()
-    name = translit(name, "ru")
-    name = re.sub(r"_", " ", name)
+    for lat, cyr in kir_rules:
+        name = name.replace(lat, cyr)
+    name = name.translate(kir_table)
+    name = name.replace("_", " ")
     return name.strip("_")
+
+
+def encode_cursor(*values) -> str:
+    # Непрозрачный курсор keyset-пагинации: base64 от JSON-списка значений ключа
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    # types — ожидаемые типы значений ключа по порядку; иначе неверный курсор дошёл бы до БД
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    if types:
+        if len(values) != len(types):
+            raise ValueError("Invalid cursor")
+        for value, expected in zip(values, types):
+            # bool — подкласс int, но id им быть не может
+            if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+                raise ValueError("Invalid cursor")
+    return values
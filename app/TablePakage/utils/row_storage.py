@@ -0,0 +1,472 @@
+# app/products/utils/row_storage.py
+import hashlib
+import json
+import os
+import uuid
+from abc import ABC, abstractmethod
+
+import asyncpg
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.product_row import ProductRow  # noqa: F401 — регистрирует таблицу в Base.metadata
+from .arrow_utils import batch_to_csv, batch_to_json_csv
+from .db_utils import create_table
+from .router_utils import to_sql_name_lat
+
+# Хранилище строк новых продуктов, если при создании оно не указано явно
+DEFAULT_PRODUCT_STORAGE = os.getenv("DEFAULT_PRODUCT_STORAGE", "table")
+
+# Режимы уникальности строк (products.unique_rows): дубли пропускаются или запрос отклоняется
+UNIQUE_ROWS_MODES = ("ignore", "reject")
+
+UNIQUE_VIOLATION = "23505"
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _index_name(relation: str, column: str) -> str:
+    # Имя индекса ограничено 63 байтами — колонка заменяется коротким хэшем
+    return f"ix_{relation}_{hashlib.md5(column.encode()).hexdigest()[:10]}"
+
+
+class RowStorage(ABC):
+    # Общее для хранилищ: сжатие дублей и уникальность строк по хэшу значений всех параметров.
+    # Наследник задаёт name (таблица или секция), relation и scope (строки продукта в relation)
+    kind = None
+
+    def __init__(self, product_id: int, unique_rows: str | None = None):
+        self.product_id = product_id
+        self.unique_rows = unique_rows
+
+    @property
+    def unique_index(self) -> str:
+        return f"ux_{self.name}_rows"
+
+    @property
+    def on_conflict(self) -> str:
+        return " ON CONFLICT DO NOTHING" if self.unique_rows == "ignore" else ""
+
+    @abstractmethod
+    async def row_hash(self, db: AsyncSession) -> str | None:
+        # Выражение хэша строки (IMMUTABLE — годится для индекса); None — колонок нет
+        ...
+
+    async def _insert(self, db: AsyncSession, sql, params=None) -> int:
+        # -> число вставленных строк (без пропущенных ON CONFLICT DO NOTHING);
+        # при reject дубль — ошибка клиента, а не 500
+        try:
+            result = await db.execute(sql, params)
+            return result.rowcount
+        except IntegrityError as e:
+            if getattr(e.orig, "sqlstate", None) == UNIQUE_VIOLATION:
+                raise HTTPException(status_code=409, detail="Такая строка уже есть (уникальность строк продукта)")
+            raise
+
+    async def count_rows(self, db: AsyncSession) -> int:
+        result = await db.execute(text(f"SELECT COUNT(*) FROM {self.relation} WHERE {self.scope}"))
+        return result.scalar()
+
+    async def compact(self, db: AsyncSession) -> int:
+        # Удаляет полные дубли одним запросом, из каждой группы остаётся строка с меньшим id
+        row_hash = await self.row_hash(db)
+        if row_hash is None:
+            return 0
+        result = await db.execute(
+            text(f"""
+                DELETE FROM {self.relation} AS r
+                USING (
+                    SELECT id, row_number() OVER (PARTITION BY {row_hash} ORDER BY id) AS rn
+                    FROM {self.relation}
+                    WHERE {self.scope}
+                ) AS d
+                WHERE {self.scope} AND r.id = d.id AND d.rn > 1
+            """)
+        )
+        return result.rowcount
+
+    async def create_unique_index(self, db: AsyncSession) -> None:
+        # Пересоздаётся при изменении набора колонок; дубли нужно убрать до этого (compact)
+        row_hash = await self.row_hash(db)
+        await db.execute(text(f'DROP INDEX IF EXISTS "{self.unique_index}"'))
+        if row_hash is not None:
+            await db.execute(text(f'CREATE UNIQUE INDEX "{self.unique_index}" ON "{self.name}" (({row_hash}))'))
+
+    async def drop_unique_index(self, db: AsyncSession) -> None:
+        await db.execute(text(f'DROP INDEX IF EXISTS "{self.unique_index}"'))
+
+    @abstractmethod
+    def _copy_target(self, columns: list[str]) -> tuple[str, list[str]]:
+        # -> (таблица, колонки) для COPY
+        ...
+
+    @abstractmethod
+    def _batch_csv(self, batch, columns: list[str], source_columns: list[str]) -> bytes:
+        ...
+
+    async def copy_batches(
+            self,
+            db: AsyncSession,
+            batches,
+            columns: list[str],
+            source_columns: list[str],
+            progress=None
+    ) -> int:
+        # COPY через соединение сессии — в той же транзакции, что и DDL; -> число вставленных строк.
+        # Чтение пачки (распаковка Parquet/IPC) и её перевод в CSV — в пуле потоков, не в event loop
+        copied = 0
+        batches = iter(batches)
+
+        async def csv_chunks():
+            nonlocal copied
+            while (batch := await run_in_threadpool(next, batches, None)) is not None:
+                copied += batch.num_rows
+                yield await run_in_threadpool(self._batch_csv, batch, columns, source_columns)
+                if progress is not None:
+                    progress.advance(batch.num_rows)
+
+        target, target_columns = self._copy_target(columns)
+        column_list = ", ".join(f'"{col}"' for col in target_columns)
+        copy_table = target
+        if self.unique_rows == "ignore":
+            # COPY не умеет ON CONFLICT: грузим во временную таблицу и переносим одним INSERT
+            copy_table = f"_copy_{uuid.uuid4().hex[:12]}"
+            await db.execute(
+                text(f'CREATE TEMP TABLE "{copy_table}" ON COMMIT DROP AS SELECT {column_list} FROM "{target}" WITH NO DATA')
+            )
+
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        try:
+            await raw_connection.driver_connection.copy_to_table(
+                copy_table, source=csv_chunks(), columns=target_columns, format="csv"
+            )
+        except asyncpg.UniqueViolationError:
+            raise HTTPException(status_code=409, detail="Такая строка уже есть (уникальность строк продукта)")
+
+        if copy_table != target:
+            # Пропущенные дубли не считаются вставленными
+            result = await db.execute(
+                text(f'INSERT INTO "{target}" ({column_list}) SELECT {column_list} FROM "{copy_table}"{self.on_conflict}')
+            )
+            return result.rowcount
+        return copied
+
+
+class TableStorage(RowStorage):
+    # Своя таблица <имя продукта>_table: колонка TEXT на параметр, новый параметр — ALTER TABLE
+    kind = "table"
+
+    def __init__(self, product_id: int, product_name: str, unique_rows: str | None = None):
+        super().__init__(product_id, unique_rows)
+        self.name = f"{to_sql_name_lat(product_name)}_table"
+        self.relation = f'"{self.name}"'
+        self.scope = "TRUE"
+
+    def column(self, name: str) -> str:
+        return f'"{name}"'
+
+    def eq(self, name: str, param: str) -> str:
+        return f'"{name}" = :{param}'
+
+    async def exists(self, db: AsyncSession) -> bool:
+        result = await db.execute(
+            text("""
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM information_schema.tables
+                    WHERE table_name = :table_name
+                )
+            """),
+            {"table_name": self.name}
+        )
+        return result.scalar()
+
+    async def ensure(self, db: AsyncSession) -> None:
+        await create_table(db, self.name)
+
+    async def list_columns(self, db: AsyncSession) -> list[str]:
+        # Колонки таблицы (без id) в порядке создания
+        result = await db.execute(
+            text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = :table_name
+                  AND column_name != 'id'
+                ORDER BY ordinal_position
+            """),
+            {"table_name": self.name}
+        )
+        return [row[0] for row in result.fetchall()]
+
+    async def load_param_columns(self, db: AsyncSession) -> dict[int, str]:
+        # Параметры, у которых есть колонка в таблице продукта
+        result = await db.execute(
+            text("""
+                SELECT ps.id, ps.name
+                FROM parameter_schemas ps
+                JOIN information_schema.columns c
+                  ON c.table_name = :table_name
+                 AND c.column_name = ps.name
+                WHERE ps.product_id = :product_id
+                ORDER BY c.ordinal_position
+            """),
+            {"table_name": self.name, "product_id": self.product_id}
+        )
+        return {row[0]: row[1] for row in result.fetchall()}
+
+    async def add_columns(self, db: AsyncSession, columns) -> None:
+        for col in columns:
+            await db.execute(text(f'ALTER TABLE "{self.name}" ADD COLUMN "{col}" TEXT'))
+        # Хэш строки охватывает все колонки — индекс уникальности пересоздаётся
+        if columns and self.unique_rows:
+            await self.create_unique_index(db)
+
+    async def row_hash(self, db: AsyncSession) -> str | None:
+        # Значение с префиксом длины, NULL — отдельной меткой: разные строки не склеиваются
+        columns = await self.list_columns(db)
+        if not columns:
+            return None
+        parts = " || '|' || ".join(f"""coalesce(length("{col}")::text || ':' || "{col}", '-')""" for col in columns)
+        return f"md5({parts})"
+
+    async def insert_rows(self, db: AsyncSession, columns: list[str], rows: list[tuple]) -> int:
+        # Одним INSERT ... SELECT из массивов колонок: в отличие от executemany, rowcount точный
+        arrays = ", ".join(f"CAST(:c{i} AS text[])" for i in range(len(columns)))
+        insert_sql = text(f"""
+            INSERT INTO "{self.name}" ({", ".join(f'"{col}"' for col in columns)})
+            SELECT * FROM unnest({arrays}){self.on_conflict}
+        """)
+        values = list(zip(*rows)) if rows else [() for _ in columns]
+        return await self._insert(db, insert_sql, {f"c{i}": list(column) for i, column in enumerate(values)})
+
+    def _copy_target(self, columns: list[str]) -> tuple[str, list[str]]:
+        return self.name, columns
+
+    def _batch_csv(self, batch, columns: list[str], source_columns: list[str]) -> bytes:
+        return batch_to_csv(batch, source_columns)
+
+    async def set_value(self, db: AsyncSession, column: str, value: str | None) -> None:
+        await db.execute(text(f'UPDATE "{self.name}" SET "{column}" = :new_value'), {"new_value": value})
+
+    async def duplicate_rows(self, db: AsyncSession, column: str, value: str | None, source_value: str) -> None:
+        # Копии строк со значением source_value, в которых колонка column заменена на value
+        columns = await self.list_columns(db)
+        select_columns = [":new_value" if col == column else f'"{col}"' for col in columns]
+        await self._insert(
+            db,
+            text(f"""
+                INSERT INTO "{self.name}" ({", ".join(f'"{c}"' for c in columns)})
+                SELECT {", ".join(select_columns)}
+                FROM "{self.name}"
+                WHERE "{column}" = :max_value{self.on_conflict}
+            """),
+            {"new_value": value, "max_value": source_value}
+        )
+
+    async def insert_from(self, db: AsyncSession, source, columns: list[str]) -> None:
+        # Перенос строк из другого хранилища с сохранением порядка
+        select_columns = ", ".join(source.column(col) for col in columns)
+        await db.execute(
+            text(f"""
+                INSERT INTO "{self.name}" ({", ".join(f'"{c}"' for c in columns)})
+                SELECT {select_columns}
+                FROM {source.relation}
+                WHERE {source.scope}
+                ORDER BY id
+            """)
+        )
+
+    async def create_column_index(self, db: AsyncSession, column: str) -> str:
+        index = _index_name(self.name, column)
+        await db.execute(text(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{self.name}" ("{column}")'))
+        return index
+
+    async def is_shared(self, db: AsyncSession) -> bool:
+        # Имя таблицы берётся из названия продукта — её может использовать другой продукт
+        result = await db.execute(
+            text("SELECT name FROM products WHERE storage = 'table' AND id <> :product_id"),
+            {"product_id": self.product_id}
+        )
+        return any(f"{to_sql_name_lat(name)}_table" == self.name for name, in result.fetchall())
+
+    async def drop(self, db: AsyncSession) -> None:
+        if not await self.is_shared(db):
+            await db.execute(text(f'DROP TABLE IF EXISTS "{self.name}"'))
+
+    def value_counts_sql(self, columns: dict[int, str], where: str, max_length: int) -> str:
+        # Количество строк на значение для каждой колонки за один запрос
+        return " UNION ALL ".join(
+            f"""SELECT "{col}" AS value, {param_id} AS parameter_schema_id, COUNT(*) AS cnt
+                FROM "{self.name}"
+                WHERE ({where}) AND "{col}" IS NOT NULL
+                  AND length("{col}") <= {max_length}
+                GROUP BY "{col}\""""
+            for param_id, col in columns.items()
+        )
+
+
+class JsonbStorage(RowStorage):
+    # Секция product_rows продукта: значения параметров — ключи JSONB-колонки data,
+    # новый параметр не требует DDL. NULL-значения в data не хранятся
+    kind = "jsonb"
+
+    def __init__(self, product_id: int, product_name: str, unique_rows: str | None = None):
+        super().__init__(product_id, unique_rows)
+        self.name = f"product_rows_p{int(product_id)}"
+        self.relation = "product_rows"
+        # Константа, а не параметр запроса: лишние секции отсекаются уже при планировании
+        self.scope = f"product_id = {int(product_id)}"
+
+    def column(self, name: str) -> str:
+        return f"(data->>{_literal(name)})"
+
+    def eq(self, name: str, param: str) -> str:
+        # Содержит пару ключ-значение — обслуживается GIN-индексом ix_product_rows_data
+        return f"data @> jsonb_build_object({_literal(name)}, CAST(:{param} AS text))"
+
+    async def exists(self, db: AsyncSession) -> bool:
+        result = await db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": self.name})
+        return result.scalar()
+
+    async def ensure(self, db: AsyncSession) -> None:
+        # Создание секции блокирует product_rows — фиксируем сразу, как create_table
+        if await self.exists(db):
+            return
+        await db.execute(
+            text(f"""
+                CREATE TABLE IF NOT EXISTS "{self.name}"
+                PARTITION OF product_rows FOR VALUES IN ({int(self.product_id)})
+            """)
+        )
+        if self.unique_rows:
+            await self.create_unique_index(db)
+        await db.commit()
+
+    async def list_columns(self, db: AsyncSession) -> list[str]:
+        return list((await self.load_param_columns(db)).values())
+
+    async def load_param_columns(self, db: AsyncSession) -> dict[int, str]:
+        # Колонки — табличные параметры продукта
+        result = await db.execute(
+            text("""
+                SELECT id, name
+                FROM parameter_schemas
+                WHERE product_id = :product_id
+                  AND type = 'Table'
+                ORDER BY id
+            """),
+            {"product_id": self.product_id}
+        )
+        return {row[0]: row[1] for row in result.fetchall()}
+
+    async def add_columns(self, db: AsyncSession, columns) -> None:
+        # Колонка появляется вместе со схемой параметра
+        return None
+
+    async def row_hash(self, db: AsyncSession) -> str | None:
+        # Текст jsonb канонический (ключи упорядочены), NULL-значения не хранятся
+        return "md5(data::text)"
+
+    def _data(self, columns: list[str], row) -> str:
+        return json.dumps(
+            {col: value for col, value in zip(columns, row) if value is not None}, ensure_ascii=False
+        )
+
+    async def insert_rows(self, db: AsyncSession, columns: list[str], rows: list[tuple]) -> int:
+        return await self._insert(
+            db,
+            text(f"""
+                INSERT INTO product_rows (product_id, data)
+                SELECT :product_id, CAST(d AS jsonb) FROM unnest(CAST(:data AS text[])) AS d{self.on_conflict}
+            """),
+            {"product_id": self.product_id, "data": [self._data(columns, row) for row in rows]}
+        )
+
+    def _copy_target(self, columns: list[str]) -> tuple[str, list[str]]:
+        return "product_rows", ["product_id", "data"]
+
+    def _batch_csv(self, batch, columns: list[str], source_columns: list[str]) -> bytes:
+        return batch_to_json_csv(batch, source_columns, columns, self.product_id)
+
+    def _assign(self, column: str) -> str:
+        # data с заменённым значением column (:new_value); NULL — удаление ключа
+        return (
+            f"CASE WHEN CAST(:new_value AS text) IS NULL THEN data - {_literal(column)} "
+            f"ELSE data || jsonb_build_object({_literal(column)}, CAST(:new_value AS text)) END"
+        )
+
+    async def set_value(self, db: AsyncSession, column: str, value: str | None) -> None:
+        await db.execute(
+            text(f"UPDATE product_rows SET data = {self._assign(column)} WHERE {self.scope}"),
+            {"new_value": value}
+        )
+
+    async def duplicate_rows(self, db: AsyncSession, column: str, value: str | None, source_value: str) -> None:
+        await self._insert(
+            db,
+            text(f"""
+                INSERT INTO product_rows (product_id, data)
+                SELECT product_id, {self._assign(column)}
+                FROM product_rows
+                WHERE {self.scope} AND {self.eq(column, "max_value")}
+                ORDER BY id{self.on_conflict}
+            """),
+            {"new_value": value, "max_value": source_value}
+        )
+
+    async def insert_from(self, db: AsyncSession, source, columns: list[str]) -> None:
+        # to_jsonb строки подзапроса: ключи — псевдонимы колонок, без ограничения на их число
+        select_columns = ", ".join(["id", *(f'{source.column(col)} AS "{col}"' for col in columns)])
+        await db.execute(
+            text(f"""
+                INSERT INTO product_rows (product_id, data)
+                SELECT {int(self.product_id)}, jsonb_strip_nulls(to_jsonb(s) - 'id')
+                FROM (
+                    SELECT {select_columns}
+                    FROM {source.relation}
+                    WHERE {source.scope}
+                ) AS s
+                ORDER BY s.id
+            """)
+        )
+
+    async def create_column_index(self, db: AsyncSession, column: str) -> str:
+        # Выражение по ключу — для сортировки, диапазонов и IS NULL по часто используемому параметру
+        index = _index_name(self.name, column)
+        await db.execute(
+            text(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{self.name}" ({self.column(column)})')
+        )
+        return index
+
+    async def is_shared(self, db: AsyncSession) -> bool:
+        return False
+
+    async def drop(self, db: AsyncSession) -> None:
+        await db.execute(text(f'DROP TABLE IF EXISTS "{self.name}"'))
+
+    def value_counts_sql(self, columns: dict[int, str], where: str, max_length: int) -> str:
+        # Один проход по секции: пары ключ-значение data, сопоставленные с параметрами
+        params = ", ".join(f"({param_id}, {_literal(col)})" for param_id, col in columns.items())
+        return f"""
+            SELECT e.value, c.parameter_schema_id, COUNT(*) AS cnt
+            FROM product_rows r
+            CROSS JOIN LATERAL jsonb_each_text(r.data) AS e(key, value)
+            JOIN (VALUES {params}) AS c(parameter_schema_id, name) ON c.name = e.key
+            WHERE r.{self.scope} AND ({where})
+              AND length(e.value) <= {max_length}
+            GROUP BY e.value, c.parameter_schema_id
+        """
+
+
+STORAGES = {"table": TableStorage, "jsonb": JsonbStorage}
+
+
+def get_storage(product_id: int, product_name: str, kind: str = "table", unique_rows: str | None = None):
+    # Хранилище строк продукта по products.storage и products.unique_rows
+    return STORAGES[kind](product_id, product_name, unique_rows)
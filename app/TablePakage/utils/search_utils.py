@@ -0,0 +1,101 @@
+# app/products/utils/search_utils.py
+import os
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.database import is_trgm_available
+
+# Порог word_similarity для нечёткого поиска: ниже значения по умолчанию (0.6),
+# чтобы при наборе первых символов находились и неточные совпадения
+AUTOCOMPLETE_SIMILARITY = float(os.getenv("AUTOCOMPLETE_SIMILARITY", "0.3"))
+
+AUTOCOMPLETE_MODES = ("prefix", "fuzzy")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_clause(expression: str, mode: str) -> tuple[str, str]:
+    # -> (условие WHERE, выражение релевантности); expression — уже приведённое к lower() поле.
+    # Префикс обслуживается btree-индексами text_pattern_ops, нечёткий поиск — GIN pg_trgm
+    if mode == "prefix":
+        return f"{expression} LIKE :pattern", f"length({expression})"
+    if is_trgm_available():
+        return f":q <% {expression}", f"word_similarity(:q, {expression})"
+    # Без pg_trgm — подстрока; совпадение ближе к началу считается релевантнее
+    return f"{expression} LIKE :contains", f"-strpos({expression}, :q)"
+
+
+def match_params(q: str) -> dict:
+    q = q.lower()
+    return {"q": q, "pattern": f"{escape_like(q)}%", "contains": f"%{escape_like(q)}%"}
+
+
+async def set_similarity_threshold(db: AsyncSession, mode: str) -> None:
+    # Действует до конца транзакции запроса
+    if mode == "fuzzy" and is_trgm_available():
+        await db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(AUTOCOMPLETE_SIMILARITY)}
+        )
+
+
+async def autocomplete_param_values(
+        db: AsyncSession,
+        product_id: int,
+        param_id: int,
+        q: str,
+        mode: str,
+        limit: int
+) -> list[dict]:
+    # Значения берутся из param_value_index, а не из таблицы продукта
+    where, score = match_clause("lower(value)", mode)
+    order = "row_count DESC, score ASC" if mode == "prefix" else "score DESC, row_count DESC"
+    await set_similarity_threshold(db, mode)
+    result = await db.execute(
+        text(f"""
+            SELECT value, row_count, {score} AS score
+            FROM param_value_index
+            WHERE product_id = :product_id AND parameter_schema_id = :param_id AND {where}
+            ORDER BY {order}, value
+            LIMIT :limit
+        """),
+        {**match_params(q), "product_id": product_id, "param_id": param_id, "limit": limit}
+    )
+    return [{"value": row.value, "row_count": row.row_count} for row in result]
+
+
+async def autocomplete_products(db: AsyncSession, field: str, q: str, mode: str, limit: int) -> list[dict]:
+    where, score = match_clause(f"lower({field})", mode)
+    order = "score ASC" if mode == "prefix" else "score DESC"
+    await set_similarity_threshold(db, mode)
+    params = {**match_params(q), "limit": limit}
+
+    if field == "name":
+        result = await db.execute(
+            text(f"""
+                SELECT id, name, manufacturer, {score} AS score
+                FROM products
+                WHERE {where}
+                ORDER BY {order}, name, id
+                LIMIT :limit
+            """),
+            params
+        )
+        return [{"id": row.id, "name": row.name, "manufacturer": row.manufacturer} for row in result]
+
+    # Производители повторяются — группируем и считаем товары
+    result = await db.execute(
+        text(f"""
+            SELECT manufacturer, COUNT(*) AS products, MAX({score}) AS score
+            FROM products
+            WHERE {where}
+            GROUP BY manufacturer
+            ORDER BY {order}, products DESC, manufacturer
+            LIMIT :limit
+        """),
+        params
+    )
+    return [{"manufacturer": row.manufacturer, "products": row.products} for row in result]
@@ -0,0 +1,77 @@
+# app/products/utils/serialization.py
+import io
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Допустимые варианты заголовка Accept для каждого формата
+ACCEPT_ALIASES = {
+    MSGPACK_MEDIA_TYPE: MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    ARROW_MEDIA_TYPE: ARROW_MEDIA_TYPE,
+    "application/vnd.apache.arrow.file": ARROW_MEDIA_TYPE,
+    JSON_MEDIA_TYPE: JSON_MEDIA_TYPE,
+}
+
+# Часть ETag: у представлений одной версии данных разные теги, иначе кэш с JSON
+# подтвердил бы (304) запрос MessagePack
+ETAG_FORMATS = {JSON_MEDIA_TYPE: "json", MSGPACK_MEDIA_TYPE: "msgpack", ARROW_MEDIA_TYPE: "arrow"}
+
+
+def negotiate(request: Request) -> str:
+    # Формат ответа по Accept с учётом q; по умолчанию JSON
+    accept = request.headers.get("accept", "")
+    best, best_q = JSON_MEDIA_TYPE, 0.0
+    for item in accept.split(","):
+        media_type, _, params = item.strip().partition(";")
+        media_type = ACCEPT_ALIASES.get(media_type.strip().lower())
+        if media_type is None:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def arrow_ipc(columns: dict[str, list]) -> bytes:
+    # Тип колонки выводится из значений: id — int64, параметры (TEXT) — string
+    import pyarrow as pa
+
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def render(
+        request: Request,
+        payload: dict,
+        columns: dict[str, list] | None = None,
+        headers: dict | None = None
+) -> Response:
+    # payload — JSON/MessagePack-тело; columns — то же содержимое в колоночном виде для Arrow IPC
+    media_type = negotiate(request)
+    headers = {**(headers or {}), "Vary": "Accept"}
+
+    if media_type == MSGPACK_MEDIA_TYPE:
+        import msgpack
+
+        return Response(msgpack.packb(payload, default=str), media_type=media_type, headers=headers)
+
+    if media_type == ARROW_MEDIA_TYPE and columns is not None:
+        return Response(arrow_ipc(columns), media_type=media_type, headers=headers)
+
+    return ORJSONResponse(payload, headers=headers)
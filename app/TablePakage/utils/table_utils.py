@@ -0,0 +1,185 @@
+# app/products/utils/table_utils.py
+import re
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache_utils import metadata_cache
+
+
+async def resolve_param_column(
+        db: AsyncSession,
+        storage,
+        param_id: int
+) -> str:
+    # Имя колонки параметра в хранилище продукта; проверки каталога кэшируются до изменения продукта
+    product_id = storage.product_id
+    cached = metadata_cache.get(product_id, ("param", param_id))
+    if cached is not None:
+        return cached
+
+    generation = metadata_cache.generation(product_id)
+    # Получаем param_name
+    param_result = await db.execute(
+        text("""
+            SELECT name
+            FROM parameter_schemas
+            WHERE id = :param_id
+              AND product_id = :product_id
+        """),
+        {
+            "param_id": param_id,
+            "product_id": product_id
+        }
+    )
+    param_name = param_result.scalar_one_or_none()
+
+    if param_name is None:
+        raise HTTPException(status_code=404, detail="Параметр не найден")
+
+    # Проверяем, что таблица существует
+    if not await storage.exists(db):
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    # Проверяем, что колонка существует
+    if param_name not in await storage.list_columns(db):
+        raise HTTPException(status_code=404, detail="Column not found")
+
+    metadata_cache.set(product_id, ("param", param_id), param_name, generation)
+    return param_name
+
+
+async def get_param_columns(
+        db: AsyncSession,
+        storage,
+        use_cache: bool = True
+) -> dict[int, str]:
+    # param_id -> имя колонки для параметров, у которых есть колонка в хранилище продукта.
+    # use_cache=False — внутри транзакции, уже изменившей колонки
+    cached = metadata_cache.get(storage.product_id, "columns") if use_cache else None
+    if cached is not None:
+        return cached
+
+    generation = metadata_cache.generation(storage.product_id)
+    columns = await storage.load_param_columns(db)
+    if use_cache:
+        metadata_cache.set(storage.product_id, "columns", columns, generation)
+    return columns
+
+
+# Операторы фильтров строк: filter=<param_id>:<op>:<value>
+FILTER_OPERATORS = {"eq": "=", "ne": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+NUMERIC_PATTERN = r"^\s*-?[0-9]+([.,][0-9]+)?\s*$"
+
+
+def parse_filters(filters: list[str], columns: dict[int, str]) -> list[tuple[str, str, str | None]]:
+    # -> [(колонка, операция, значение)]; значения в таблицах продуктов хранятся как TEXT
+    parsed = []
+    for item in filters:
+        parts = item.split(":", 2)
+        if len(parts) < 2 or not parts[0].isdigit():
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {item}")
+        param_id, op = int(parts[0]), parts[1]
+        value = parts[2] if len(parts) == 3 else None
+        if param_id not in columns:
+            raise HTTPException(status_code=400, detail=f"Unknown param_id in filter: {param_id}")
+        if op in ("null", "notnull"):
+            value = None
+        elif op not in FILTER_OPERATORS or value is None:
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {item}")
+        parsed.append((columns[param_id], op, value))
+    return parsed
+
+
+def build_rows_query(
+        storage,
+        columns: list[str],
+        filters: list[tuple[str, str, str | None]],
+        after_id: int = 0,
+        limit: int | None = None
+):
+    # SELECT строк продукта с keyset-пагинацией по id
+    conditions = [storage.scope, "id > :after_id"]
+    params = {"after_id": after_id}
+    for i, (column, op, value) in enumerate(filters):
+        expression = storage.column(column)
+        if op == "null":
+            conditions.append(f"{expression} IS NULL")
+        elif op == "notnull":
+            conditions.append(f"{expression} IS NOT NULL")
+        elif op == "eq":
+            conditions.append(storage.eq(column, f"f{i}"))
+            params[f"f{i}"] = value
+        elif op == "ne" or not re.match(NUMERIC_PATTERN, value):
+            conditions.append(f"{expression} {FILTER_OPERATORS[op]} :f{i}")
+            params[f"f{i}"] = value
+        else:
+            # Диапазон по числу: нечисловые значения колонки в сравнение не попадают
+            conditions.append(
+                f"""(CASE WHEN {expression} ~ '{NUMERIC_PATTERN}'
+                     THEN replace(trim({expression}), ',', '.')::numeric END) {FILTER_OPERATORS[op]} :f{i}"""
+            )
+            params[f"f{i}"] = Decimal(value.strip().replace(",", "."))
+
+    select_columns = ", ".join(["id", *(f'{storage.column(c)} AS "{c}"' for c in columns)])
+    sql = f"SELECT {select_columns} FROM {storage.relation} WHERE {' AND '.join(conditions)} ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql), params
+
+
+def project_columns(param_ids: str | None, columns: dict[int, str]) -> list[str]:
+    # ?param_ids=3,5 -> имена колонок в запрошенном порядке; без параметра — все колонки
+    if not param_ids:
+        return list(columns.values())
+    selected = []
+    for item in param_ids.split(","):
+        item = item.strip()
+        if not item.isdigit() or int(item) not in columns:
+            raise HTTPException(status_code=400, detail=f"Unknown param_id: {item}")
+        selected.append(columns[int(item)])
+    return list(dict.fromkeys(selected))
+
+
+async def get_distinct_values(db: AsyncSession, storage, columns: list[str]) -> dict[str, list]:
+    # Уникальные значения всех колонок за один проход по строкам продукта
+    if not columns:
+        return {}
+    aggregates = ", ".join(f"array_agg(DISTINCT {storage.column(c)})" for c in columns)
+    row = (await db.execute(text(f"SELECT {aggregates} FROM {storage.relation} WHERE {storage.scope}"))).one()
+    return {column: values or [] for column, values in zip(columns, row)}
+
+
+async def add_param_columns(
+        db: AsyncSession,
+        storage,
+        product_name: str,
+        columns: set[str]
+) -> None:
+    # Недостающие колонки хранилища продукта и их схемы параметров
+    await storage.add_columns(db, columns)
+    for col in columns:
+        await db.execute(
+            text("""
+                INSERT INTO parameter_schemas (name, type, table_name, product_id)
+                SELECT
+                CAST(:name AS VARCHAR),
+                'Table',
+                CAST(:table_name AS VARCHAR),
+                :product_id
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM parameter_schemas
+                    WHERE name = :name
+                      AND product_id = :product_id
+                )
+            """),
+            {
+                "name": col,
+                "table_name": product_name,
+                "product_id": storage.product_id
+            }
+        )
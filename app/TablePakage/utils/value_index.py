@@ -0,0 +1,92 @@
+# app/products/utils/value_index.py
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.param_value_index import ParamValueIndex  # noqa: F401 — регистрирует таблицу в Base.metadata
+from .table_utils import get_param_columns
+
+# Длинные тексты (описания) не индексируются: их не ищут по точному значению,
+# а строка btree-индекса ограничена ~2.7 КБ
+MAX_INDEXED_VALUE_LENGTH = 256
+
+# Пространство рекомендательных блокировок изменения строк продукта (второй ключ — product_id)
+ROWS_LOCK_KEY = 7301
+
+
+async def lock_product_rows(db: AsyncSession, product_id: int) -> None:
+    # До конца транзакции: вставки и удаления строк одного продукта с пересчётом счётчиков
+    # выполняются по очереди, иначе чужие строки, закоммиченные между границей и дельтой,
+    # попадут в дельту дважды
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(:key, :product_id)"),
+        {"key": ROWS_LOCK_KEY, "product_id": product_id}
+    )
+
+
+async def get_max_row_id(db: AsyncSession, storage) -> int:
+    # Граница для дельты: строки, вставленные после, имеют id больше.
+    # Блокировка берётся до границы и держится до commit вставки
+    await lock_product_rows(db, storage.product_id)
+    result = await db.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {storage.relation} WHERE {storage.scope}"))
+    return result.scalar()
+
+
+async def apply_value_delta(
+        db: AsyncSession,
+        storage,
+        where: str,
+        params: dict | None = None,
+        sign: int = 1
+) -> None:
+    # Прибавляет (sign=1) или вычитает (sign=-1) счётчики значений строк, подходящих под where.
+    # Вызывается в транзакции изменения: для вставки — после неё, для удаления — до неё
+    await lock_product_rows(db, storage.product_id)
+    columns = await get_param_columns(db, storage, use_cache=False)
+    if not columns:
+        return
+
+    await db.execute(
+        text(f"""
+            INSERT INTO param_value_index (value, product_id, parameter_schema_id, row_count)
+            SELECT value, :product_id, parameter_schema_id, :sign * cnt
+            FROM ({storage.value_counts_sql(columns, where, MAX_INDEXED_VALUE_LENGTH)}) AS delta
+            ON CONFLICT (value, product_id, parameter_schema_id) DO UPDATE
+            SET row_count = param_value_index.row_count + EXCLUDED.row_count
+        """),
+        {**(params or {}), "product_id": storage.product_id, "sign": sign}
+    )
+    if sign < 0:
+        await db.execute(
+            text("DELETE FROM param_value_index WHERE product_id = :product_id AND row_count <= 0"),
+            {"product_id": storage.product_id}
+        )
+
+
+async def rebuild_value_index(
+        db: AsyncSession,
+        storage,
+        param_ids: list[int] | None = None
+) -> None:
+    # Полный пересчёт значений продукта (или только указанных параметров)
+    product_id = storage.product_id
+    await lock_product_rows(db, product_id)
+    columns = await get_param_columns(db, storage, use_cache=False)
+    if param_ids is not None:
+        columns = {pid: col for pid, col in columns.items() if pid in param_ids}
+
+    delete_sql = "DELETE FROM param_value_index WHERE product_id = :product_id"
+    delete_params = {"product_id": product_id}
+    if param_ids is not None:
+        delete_sql += " AND parameter_schema_id = ANY(:param_ids)"
+        delete_params["param_ids"] = param_ids
+    await db.execute(text(delete_sql), delete_params)
+
+    if columns:
+        await db.execute(
+            text(f"""
+                INSERT INTO param_value_index (value, product_id, parameter_schema_id, row_count)
+                SELECT value, :product_id, parameter_schema_id, cnt
+                FROM ({storage.value_counts_sql(columns, "TRUE", MAX_INDEXED_VALUE_LENGTH)}) AS counts
+            """),
+            {"product_id": product_id}
+        )
@@ -0,0 +1,89 @@
+# app/products/utils/version_utils.py
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..model.product_version import ProductVersion  # noqa: F401 — регистрирует таблицу в Base.metadata
+from .cache_utils import metadata_cache
+
+
+async def bump_version(db: AsyncSession, product_id: int) -> None:
+    # Вызывается в той же транзакции, что и изменение данных, до commit
+    await db.execute(
+        text("""
+            INSERT INTO product_versions (product_id, version, updated_at)
+            VALUES (:product_id, 1, now())
+            ON CONFLICT (product_id) DO UPDATE
+            SET version = product_versions.version + 1,
+                updated_at = now()
+        """),
+        {"product_id": product_id}
+    )
+
+
+async def get_product_version(db: AsyncSession, product_id: int):
+    # Имя продукта, хранилище строк, версия данных и время последнего изменения одним запросом
+    cached = metadata_cache.get(product_id, "version")
+    if cached is not None:
+        return cached
+
+    generation = metadata_cache.generation(product_id)
+    result = await db.execute(
+        text("""
+            SELECT p.name,
+                   p.storage,
+                   p.unique_rows,
+                   COALESCE(v.version, 0) AS version,
+                   COALESCE(v.updated_at, p.created_at) AS updated_at
+            FROM products p
+            LEFT JOIN product_versions v ON v.product_id = p.id
+            WHERE p.id = :id
+        """),
+        {"id": product_id}
+    )
+    product = result.one_or_none()
+    if product is not None:
+        metadata_cache.set(product_id, "version", product, generation)
+    return product
+
+
+def make_etag(product_id: int, version: int, *parts) -> str:
+    # Слабый ETag: XLSX с одинаковыми данными может отличаться побайтно
+    suffix = "".join(f"-{part}" for part in parts)
+    return f'W/"{product_id}-{version}{suffix}"'
+
+
+def cache_headers(etag: str, last_modified: datetime | None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Слабое сравнение: W/"x" и "x" совпадают
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified_response(etag: str, last_modified: datetime | None) -> Response:
+    # Vary — как у ответов render(): 304 должен нести те же заголовки кэширования, что и 200
+    return Response(status_code=304, headers={**cache_headers(etag, last_modified), "Vary": "Accept"})
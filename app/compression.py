@@ -0,0 +1,140 @@
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli отдаём только gzip
+    brotli = None
+
+# Ответы меньше порога не сжимаются — выигрыш не окупает CPU
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# Уже сжатые форматы: XLSX/Parquet/ZIP и изображения
+INCOMPRESSIBLE_PREFIXES = (
+    "image/",
+    "application/zip",
+    "application/gzip",
+    "application/vnd.openxmlformats",
+    "application/vnd.apache.parquet",
+)
+
+# Потоковые форматы отдаются сразу, без буферизации (в том числе выгрузка Arrow IPC пачками)
+STREAMING_PREFIXES = ("application/x-ndjson", "text/event-stream", "application/vnd.apache.arrow.")
+
+# Больше этого тело не буферизуется ради сжатия и уходит как есть
+COMPRESS_MAX_BUFFER = int(os.getenv("COMPRESS_MAX_BUFFER", str(16 * 1024 * 1024)))
+
+
+class CompressionMiddleware:
+    # Сжимает ответы целиком (brotli, если клиент его принимает, иначе gzip).
+    # Тело собирается до конца ответа (BaseHTTPMiddleware отдаёт его частями);
+    # потоковые и слишком большие ответы идут без сжатия.
+    def __init__(
+            self,
+            app,
+            minimum_size: int = COMPRESS_MIN_SIZE,
+            max_buffer: int = COMPRESS_MAX_BUFFER,
+            gzip_level: int = 6,
+            brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_buffer = max_buffer
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, accept_encoding: str) -> str | None:
+        accepted = {item.split(";")[0].strip().lower() for item in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def should_skip(self, headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "")
+        return (
+            "content-encoding" in headers
+            or content_type.startswith(INCOMPRESSIBLE_PREFIXES)
+            or content_type.startswith(STREAMING_PREFIXES)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        buffered = 0
+        passthrough = False
+
+        async def flush_uncompressed(message):
+            # Отдаём накопленное как есть и дальше только проксируем
+            nonlocal passthrough
+            passthrough = True
+            await send(start_message)
+            if chunks:
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                chunks.clear()
+            await send(message)
+
+        async def send_wrapper(message):
+            nonlocal start_message, buffered, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                if self.should_skip(MutableHeaders(raw=start_message["headers"])):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                # pathsend и прочие расширения — отдаём как есть
+                await flush_uncompressed(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if more_body:
+                buffered += len(body)
+                if buffered > self.max_buffer:
+                    await flush_uncompressed(message)
+                else:
+                    chunks.append(body)
+                return
+
+            chunks.append(body)
+            body = b"".join(chunks)
+            chunks.clear()
+            passthrough = True
+
+            if len(body) < self.minimum_size:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            compressed = self.compress(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
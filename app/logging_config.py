@@ -1,36 +1,211 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import random
+import time
+import uuid
 
 # Настройка пути
-LOG_DIR = "/etc/loggs/fastapi"
+LOG_DIR = os.getenv("LOG_DIR", "/etc/loggs/fastapi")
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
-# Создаём директорию
-os.makedirs(LOG_DIR, exist_ok=True)
+# Доля сохраняемых записей по логгерам: "sqlalchemy.engine=0.01,uvicorn.access=0.1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
 
-# Формат
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Вывод SQL (раньше включался через echo=True движка)
+SQL_ECHO = os.getenv("SQL_ECHO", "true").lower() in ("1", "true", "yes")
 
-# Файл-хэндлер с ротацией
-file_handler = logging.handlers.RotatingFileHandler(
-    LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5
-)
-file_handler.setFormatter(formatter)
+# Идентификатор текущего запроса, выставляется middleware в main.py
+request_id_var = contextvars.ContextVar("request_id", default=None)
 
-# Настроим root-логгер, чтобы перехватить ВСЁ
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-root_logger.addHandler(file_handler)
+# Дополнительные поля записи, которые попадают в JSON
+EXTRA_FIELDS = ("request_id", "method", "path", "status", "duration_ms")
 
-# Также оставим вывод в stdout (важно для docker logs)
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-root_logger.addHandler(console_handler)
+_listener = None
 
-# Отключим дублирование (чтобы не было дублей)
-root_logger.propagate = True
 
-print(f"✅ Логирование настроено. Логи пишутся в {LOG_FILE}")
+def parse_sampling(spec: str) -> dict:
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class RequestContextFilter(logging.Filter):
+    # Фиксирует request_id в потоке, где создана запись, до передачи в очередь
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # Пропускает только долю записей логгера; WARNING и выше не сэмплируются
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def rate_for(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    # Стандартный prepare() форматирует запись и дописывает traceback в message —
+    # здесь подставляются только аргументы сообщения, traceback остаётся отдельным полем exc
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Traceback держит кадры стека — в очередь уходит уже готовый текст
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestLogMiddleware:
+    # Одна JSON-строка на запрос с request_id и длительностью. Запись делается после последней
+    # части тела (more_body=False), так что для потоковых выгрузок и SSE в duration_ms входит передача
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("app.requests")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status = 500
+        logged = False
+
+        def log() -> None:
+            nonlocal logged
+            logged = True
+            self.logger.info(
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                }
+            )
+
+        async def send_logged(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                log()
+
+        try:
+            await self.app(scope, receive, send_logged)
+        finally:
+            # Ошибка до ответа или обрыв соединения посреди потока
+            if not logged:
+                log()
+            request_id_var.reset(token)
+
+
+def setup_logging() -> None:
+    # Все записи уходят в очередь, запись в файл и stdout идёт в фоновом потоке
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    handlers = []
+
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    except OSError:
+        # Без тома для логов (локальный запуск) пишем только в stdout
+        pass
+
+    # Вывод в stdout (важно для docker logs)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+    # Настроим root-логгер, чтобы перехватить ВСЁ
+    root_logger = logging.getLogger()
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.handlers = [queue_handler]
+
+    # Логгеры uvicorn пишут синхронно в свои хэндлеры — перенаправляем их в очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    if SQL_ECHO:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    logging.getLogger(__name__).info("Логирование настроено. Логи пишутся в %s", LOG_FILE)
+
+
+def shutdown_logging() -> None:
+    # Дописывает оставшиеся в очереди записи
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
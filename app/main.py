@@ -1,14 +1,25 @@
+import os
+
 from fastapi import FastAPI, Depends
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 #from .TablePakage.model.product import Product
 from .TablePakage.router.products import router as products_router
 from .TablePakage.router.parameters import router as parameters_router
 from .TablePakage.router.tables import router as tables_router
-from .TablePakage.model.database import create_tables
+from .TablePakage.router.metrics import router as metrics_router
+from .TablePakage.router.events import router as events_router
+from .TablePakage.model.database import detect_trgm_extension
+from .TablePakage.model.migrations import SCHEMA_AUTO_MIGRATE, run_migrations
+from .TablePakage.utils.admission import AdmissionMiddleware
+from .TablePakage.utils.change_bus import change_bus
+from .TablePakage.utils.image_utils import shutdown_image_pool
+from .TablePakage.utils.maintenance import vacuum_queue
 
 #from .TablePakage.router.formulas import router as formulas_router
 
-#import app.logging_config
+from .logging_config import RequestLogMiddleware, setup_logging
+from .compression import CompressionMiddleware
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,24 +28,50 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title=" App API", version="1.0.0")
+setup_logging()
+
+app = FastAPI(title=" App API", version="1.0.0", default_response_class=ORJSONResponse)
+
+# Пулы допуска проверяются до чтения тела запроса; самый внутренний middleware — отказы попадают в лог
+app.add_middleware(AdmissionMiddleware)
 
+# Сжатие gzip/brotli для ответов больше COMPRESS_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
 
+# Логируем каждый запрос одной JSON-строкой с request_id и длительностью (внешний middleware —
+# длительность включает сжатие и отдачу всего тела)
+app.add_middleware(RequestLogMiddleware)
 
-# Создаём таблицы при старте приложения
+
+# Схему создают миграции (alembic upgrade head) до старта воркеров;
+# при старте воркер только проверяет расширения и подключает шину изменений
 @app.on_event("startup")
 async def startup_event():
-    await create_tables()
+    if SCHEMA_AUTO_MIGRATE:
+        await run_migrations()
+    await detect_trgm_extension()
+    await change_bus.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await change_bus.stop()
+    await vacuum_queue.stop()
+    shutdown_image_pool()
 
 
-# Подключаем статические файлы (для изображений)
+# Подключаем статические файлы (для изображений).
+# За nginx /api/files/ отдаётся им напрямую с общего тома — SERVE_STATIC_FILES=false
 # app.mount("/static", StaticFiles(directory="app/products/static"), name="static")
-app.mount("/api/files", StaticFiles(directory="./static"), name="files")
+if os.getenv("SERVE_STATIC_FILES", "true").lower() in ("1", "true", "yes"):
+    app.mount("/api/files", StaticFiles(directory="./static"), name="files")
 
 # Подключаем роутеры
 app.include_router(products_router, prefix="/api")
 app.include_router(parameters_router, prefix="/api")
 app.include_router(tables_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+app.include_router(events_router, prefix="/api")
 #app.include_router(formulas_router, prefix="/api")
 
 
@@ -0,0 +1,64 @@
+# app/migrations/env.py
+import asyncio
+import logging
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Корень, в котором лежит пакет app (в контейнере — /data)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Импорт пакета регистрирует все модели в Base.metadata (нужно для autogenerate)
+import app.TablePakage  # noqa: F401
+from app.TablePakage.model.database import DATABASE_URL, Base
+
+config = context.config
+
+# При запуске из приложения логирование уже настроено — не перетираем его
+if config.config_file_name is not None and not logging.getLogger().handlers:
+    fileConfig(config.config_file_name)
+
+# Ключ advisory-блокировки: одновременно запущенные контейнеры применяют миграции по очереди
+MIGRATION_LOCK_KEY = 7_240_001
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Таблицы продуктов (<имя>_table) создаются приложением на лету и миграциями не управляются
+    return not (type_ == "table" and reflected and compare_to is None)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=Base.metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=Base.metadata, include_object=include_object)
+    with context.begin_transaction():
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    # Отдельный движок без пула: миграции могут идти в своём потоке и своём event loop
+    connectable = create_async_engine(DATABASE_URL, poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,114 @@
+"""baseline schema
+
+Схема на момент перехода с create_all на миграции. Все операции идемпотентны:
+базы, созданные раньше через create_all, проходят миграцию без изменений.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        description TEXT,
+        manufacturer VARCHAR(255),
+        image VARCHAR(512),
+        image_url VARCHAR(512),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS parameter_schemas (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        description TEXT,
+        type VARCHAR(50) NOT NULL,
+        table_name VARCHAR(255),
+        field_of_view JSON,
+        product_id INTEGER NOT NULL REFERENCES products (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_versions (
+        product_id INTEGER PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE,
+        version INTEGER NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS param_value_index (
+        value TEXT NOT NULL,
+        product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+        parameter_schema_id INTEGER NOT NULL REFERENCES parameter_schemas (id) ON DELETE CASCADE,
+        row_count INTEGER NOT NULL,
+        PRIMARY KEY (value, product_id, parameter_schema_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS column_names (
+        product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+        sql_name VARCHAR(255) NOT NULL,
+        display_name TEXT NOT NULL,
+        PRIMARY KEY (product_id, sql_name)
+    )
+    """,
+]
+
+INDEXES = [
+    "ix_products_id ON products (id)",
+    "ix_products_created_at_id ON products (created_at, id)",
+    "ix_products_manufacturer ON products (manufacturer)",
+    "ix_products_name_lower_prefix ON products (lower(name) text_pattern_ops)",
+    "ix_products_manufacturer_lower_prefix ON products (lower(manufacturer) text_pattern_ops)",
+    "ix_parameter_schemas_id ON parameter_schemas (id)",
+    "ix_param_value_index_product_param_prefix "
+    "ON param_value_index (product_id, parameter_schema_id, lower(value) text_pattern_ops)",
+]
+
+# Триграммные GIN-индексы автодополнения — только если расширение pg_trgm удалось создать
+TRGM_INDEXES = [
+    "ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)",
+    "ix_products_manufacturer_trgm ON products USING gin (lower(manufacturer) gin_trgm_ops)",
+    "ix_param_value_index_value_trgm ON param_value_index USING gin (lower(value) gin_trgm_ops)",
+]
+
+
+def create_trgm_extension(bind) -> bool:
+    # В savepoint: без прав на CREATE EXTENSION откатывается только эта команда
+    try:
+        with bind.begin_nested():
+            bind.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        return True
+    except DBAPIError:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    trgm = create_trgm_extension(bind)
+
+    for ddl in TABLES:
+        op.execute(ddl)
+    # Индекс ранних версий индекса значений, заменён ix_param_value_index_product_param_prefix
+    op.execute("DROP INDEX IF EXISTS ix_param_value_index_product_param")
+    for index in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+    if trgm:
+        for index in TRGM_INDEXES:
+            op.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+
+
+def downgrade() -> None:
+    for table in ("column_names", "param_value_index", "product_versions", "parameter_schemas", "products"):
+        op.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,39 @@
+"""product_rows storage
+
+Хранилище строк "jsonb": одна таблица product_rows, секционированная по product_id,
+вместо отдельной таблицы на продукт. Выбор хранилища — products.storage.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS storage VARCHAR(16) DEFAULT 'table' NOT NULL")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS product_rows_id_seq")
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_rows (
+            product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+            id BIGINT DEFAULT nextval('product_rows_id_seq') NOT NULL,
+            data JSONB DEFAULT '{}'::jsonb NOT NULL,
+            PRIMARY KEY (product_id, id)
+        ) PARTITION BY LIST (product_id)
+        """
+    )
+    op.execute("ALTER SEQUENCE product_rows_id_seq OWNED BY product_rows.id")
+    # Индекс на секционированной таблице создаётся и на всех её секциях
+    op.execute("CREATE INDEX IF NOT EXISTS ix_product_rows_data ON product_rows USING gin (data jsonb_path_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS product_rows")
+    op.execute("DROP SEQUENCE IF EXISTS product_rows_id_seq")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS storage")
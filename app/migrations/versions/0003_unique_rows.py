@@ -0,0 +1,22 @@
+"""products.unique_rows
+
+Режим уникальности строк продукта (индекс по хэшу строки создаёт приложение).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS unique_rows VARCHAR(16)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS unique_rows")
@@ -0,0 +1,3 @@
+"""
+Benchmarks for the configurator API (run from the repository root, see README)
+"""
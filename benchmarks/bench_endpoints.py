@@ -0,0 +1,187 @@
+# benchmarks/bench_endpoints.py
+"""
+Бенчмарк эндпоинтов импорта/экспорта на синтетических таблицах продукции.
+
+Запросы идут в настоящее приложение (in-process ASGI) и в локальный Postgres,
+параметры подключения берутся из тех же переменных окружения, что и у приложения.
+
+    python -m benchmarks.bench_endpoints --profile standard --output bench/results.json
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+from .datagen import get_workbook
+from .harness import QueryCounter, RssSampler, latency_summary, load_app, run_meta, write_results
+
+PROFILES = {
+    "quick": {"rows": [1000], "params": [10]},
+    "standard": {"rows": [1000, 100_000], "params": [10, 100]},
+    "full": {"rows": [1000, 100_000, 1_000_000], "params": [10, 100]},
+}
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+async def measure(name: str, engine, calls: list, rows: int | None = None) -> dict:
+    # calls — список фабрик корутин, каждая выполняет один HTTP-запрос
+    latencies = []
+    with QueryCounter(engine) as queries, RssSampler() as rss:
+        started = time.perf_counter()
+        for call in calls:
+            t0 = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "latency": latency_summary(latencies),
+        "requests_per_s": round(len(calls) / elapsed, 3) if elapsed else 0.0,
+        "queries": queries.count,
+        "queries_per_call": round(queries.count / len(calls), 2) if calls else 0.0,
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+    if rows is not None:
+        result["rows_per_s"] = round(rows * len(calls) / elapsed, 1) if elapsed else 0.0
+    print(f"  {name:<28} p50={result['latency']['p50_ms']:>10.1f} ms  queries/call={result['queries_per_call']}")
+    return result
+
+
+def upload(client: httpx.AsyncClient, url: str, product_id: int, path: str):
+    async def call():
+        with open(path, "rb") as f:
+            return await client.post(
+                url,
+                params={"product_id": product_id},
+                files={"file": (os.path.basename(path), f, XLSX_MEDIA_TYPE)},
+            )
+    return call
+
+
+def request(client: httpx.AsyncClient, method: str, url: str, **params):
+    async def call():
+        return await client.request(method, url, params=params)
+    return call
+
+
+async def drop_product(engine, product_id: int, table_name: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+        await conn.execute(text(f'DROP TABLE IF EXISTS "product_rows_p{product_id}"'))
+        await conn.execute(text("DELETE FROM parameter_schemas WHERE product_id = :id"), {"id": product_id})
+        await conn.execute(text("DELETE FROM products WHERE id = :id"), {"id": product_id})
+
+
+async def run_scenario(client, engine, workbook: str, rows: int, params: int, args) -> dict:
+    from app.TablePakage.utils.router_utils import to_sql_name_lat
+
+    product_name = f"bench {rows}x{params} {uuid.uuid4().hex[:8]}"
+    response = await client.post(
+        "/api/products/", data={"name": product_name, "manufacturer": "bench", "storage": args.storage}
+    )
+    response.raise_for_status()
+    product_id = response.json()["id"]
+    table_name = f"{to_sql_name_lat(product_name)}_table"
+
+    endpoints = {}
+    try:
+        endpoints["upload_full_xlsx"] = await measure(
+            "upload_full_xlsx", engine,
+            [upload(client, "/api/tables/upload_full_xlsx", product_id, workbook)], rows
+        )
+        endpoints["upload_matched_params_xlsx"] = await measure(
+            "upload_matched_params_xlsx", engine,
+            [upload(client, "/api/tables/upload_matched_params_xlsx", product_id, workbook)], rows
+        )
+
+        response = await client.get(f"/api/parameters/by_product/{product_id}")
+        response.raise_for_status()
+        param_ids = [p["id"] for p in response.json()][:args.max_params]
+
+        endpoints["get_unique_param"] = await measure(
+            "get_unique_param", engine,
+            [
+                request(client, "GET", "/api/tables/get_unique_param", product_id=product_id, param_id=param_id)
+                for _ in range(args.repeat)
+                for param_id in param_ids
+            ]
+        )
+        endpoints["download_xlsx"] = await measure(
+            "download_xlsx", engine,
+            [
+                request(client, "POST", "/api/tables/download_xlsx", product_id=product_id)
+                for _ in range(args.export_repeat)
+            ],
+            rows * 2
+        )
+        endpoints["added_value_for_param"] = await measure(
+            "added_value_for_param", engine,
+            [
+                request(
+                    client, "POST", "/api/tables/added_value_for_param",
+                    product_id=product_id, param_id=param_id, value=f"bench-{uuid.uuid4().hex[:6]}"
+                )
+                for param_id in param_ids[:3]
+            ]
+        )
+    finally:
+        if not args.keep:
+            await drop_product(engine, product_id, table_name)
+
+    return {"rows": rows, "params": params, "endpoints": endpoints}
+
+
+async def main(args) -> None:
+    profile = PROFILES[args.profile]
+    rows_list = args.rows or profile["rows"]
+    params_list = args.params or profile["params"]
+
+    data_dir = os.path.abspath(args.data_dir)
+    output = os.path.abspath(args.output)
+    app, engine = load_app(tempfile.mkdtemp(prefix="agr-bench-"))
+
+    results = {"meta": run_meta(), "profile": args.profile, "storage": args.storage, "scenarios": []}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async with app.router.lifespan_context(app):
+            for rows in rows_list:
+                for params in params_list:
+                    print(f"{rows} строк x {params} параметров")
+                    workbook = get_workbook(data_dir, rows, params, args.seed)
+                    results["scenarios"].append(
+                        await run_scenario(client, engine, workbook, rows, params, args)
+                    )
+    await engine.dispose()
+
+    write_results(output, results)
+    print(f"Результаты записаны в {output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк эндпоинтов таблиц продукции")
+    parser.add_argument("--profile", choices=PROFILES, default="quick")
+    parser.add_argument("--rows", type=int, nargs="*", help="Размеры таблиц (переопределяют профиль)")
+    parser.add_argument("--params", type=int, nargs="*", help="Количество колонок-параметров")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторы get_unique_param на параметр")
+    parser.add_argument("--export-repeat", type=int, default=3, help="Повторы download_xlsx")
+    parser.add_argument("--max-params", type=int, default=20, help="Сколько параметров опрашивать")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench/data", help="Кэш сгенерированных XLSX")
+    parser.add_argument("--output", default="bench/results.json")
+    parser.add_argument("--storage", choices=("table", "jsonb"), default="table",
+                        help="Хранилище строк продуктов сценария")
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданные продукты и таблицы")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,146 @@
+# benchmarks/bench_startup.py
+"""
+Бенчмарк холодного старта: время импорта приложения и время до первого ответа.
+
+Каждый замер — новый процесс: импорт app.main (с разбивкой -X importtime по самым
+тяжёлым модулям) и uvicorn, опрашиваемый до первого ответа /health и первого ответа API.
+Миграции в замер не входят — схема должна быть применена заранее (alembic upgrade head).
+
+    python -m benchmarks.bench_startup --repeat 5 --output bench/startup.json
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .harness import REPO_ROOT, latency_summary, run_meta, write_results
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def app_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("SCHEMA_AUTO_MIGRATE", "false")
+    return env
+
+
+def workdir() -> str:
+    # Приложение монтирует ./static относительно текущей директории
+    path = tempfile.mkdtemp(prefix="agr-startup-")
+    os.makedirs(os.path.join(path, "static", "images"), exist_ok=True)
+    return path
+
+
+def measure_import(cwd: str) -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=cwd, env=app_env(), text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def heaviest_imports(cwd: str, top: int) -> list[dict]:
+    # Модули верхнего уровня с наибольшим накопленным временем импорта
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=cwd, env=app_env(), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            modules.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client: httpx.Client, url: str, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"Нет ответа от {url}")
+
+
+def measure_first_response(cwd: str, timeout: float) -> tuple[float, float]:
+    # -> (до первого ответа /health, до первого ответа API с запросом в БД), секунды от запуска процесса
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=app_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=5) as client:
+            wait_for(client, f"{base_url}/health", started + timeout)
+            health = time.perf_counter() - started
+            wait_for(client, f"{base_url}/api/products/?limit=1", started + timeout)
+            api = time.perf_counter() - started
+        return health, api
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(args) -> None:
+    cwd = workdir()
+    imports, health, api = [], [], []
+    for i in range(args.repeat):
+        imports.append(measure_import(cwd))
+        first_health, first_api = measure_first_response(cwd, args.timeout)
+        health.append(first_health)
+        api.append(first_api)
+        print(f"  #{i + 1}: импорт {imports[-1] * 1000:.0f} мс, /health {first_health * 1000:.0f} мс, "
+              f"API {first_api * 1000:.0f} мс")
+
+    heaviest = heaviest_imports(cwd, args.top)
+    print("Самые тяжёлые импорты:")
+    for module in heaviest:
+        print(f"  {module['module']:<40} {module['cumulative_ms']:>8.1f} мс")
+
+    # Формат сценариев совместим с benchmarks.compare
+    results = {
+        "meta": run_meta(),
+        "scenarios": [{
+            "name": "startup",
+            "endpoints": {
+                "import_app": {"latency": latency_summary(imports)},
+                "first_health": {"latency": latency_summary(health)},
+                "first_api": {"latency": latency_summary(api)},
+            },
+        }],
+        "heaviest_imports": heaviest,
+    }
+    output = os.path.abspath(args.output)
+    write_results(output, results)
+    print(f"Результаты записаны в {output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта приложения")
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько раз запускать процесс")
+    parser.add_argument("--top", type=int, default=15, help="Сколько тяжёлых импортов показать")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Ожидание первого ответа, с")
+    parser.add_argument("--output", default="bench/startup.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,77 @@
+# benchmarks/compare.py
+"""
+Сравнение двух файлов результатов бенчмарка (например, до и после коммита).
+
+    python -m benchmarks.compare bench/base.json bench/results.json --threshold 0.15
+
+Код выхода 1, если хотя бы одна метрика ухудшилась больше порога.
+"""
+import argparse
+import json
+import sys
+
+# Метрика -> True, если большее значение лучше
+METRICS = {
+    "latency.p50_ms": False,
+    "latency.p95_ms": False,
+    "latency.p99_ms": False,
+    "rows_per_s": True,
+    "requests_per_s": True,
+    "queries_per_call": False,
+    "peak_rss_mb": False,
+}
+
+
+def flatten(results: dict) -> dict:
+    flat = {}
+    for scenario in results.get("scenarios", []):
+        prefix = scenario.get("name") or f"{scenario['rows']}x{scenario['params']}"
+        for endpoint, metrics in scenario["endpoints"].items():
+            for metric in METRICS:
+                value = metrics
+                for part in metric.split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                if value is not None:
+                    flat[(f"{prefix}/{endpoint}", metric)] = value
+    return flat
+
+
+def compare(base: dict, head: dict, threshold: float) -> list[tuple]:
+    rows = []
+    base_flat = flatten(base)
+    head_flat = flatten(head)
+    for key in sorted(base_flat.keys() & head_flat.keys()):
+        old, new = base_flat[key], head_flat[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        higher_is_better = METRICS[key[1]]
+        regression = -change > threshold if higher_is_better else change > threshold
+        rows.append((key[0], key[1], old, new, change, regression))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарка")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}")
+    regressions = 0
+    for name, metric, old, new, change, regression in compare(base, head, args.threshold):
+        mark = "REGRESSION" if regression else ""
+        regressions += regression
+        print(f"{name:<50} {metric:<18} {old:>12.2f} -> {new:>12.2f} {change:>+8.1%} {mark}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# benchmarks/datagen.py
+import os
+import random
+
+from openpyxl import Workbook
+
+# Основы заголовков — типичные параметры арматуры, с кириллицей и пробелами
+HEADER_WORDS = [
+    "Диаметр номинальный",
+    "Давление номинальное",
+    "Материал корпуса",
+    "Материал уплотнения",
+    "Тип присоединения",
+    "Климатическое исполнение",
+    "Температура среды",
+    "Строительная длина",
+    "Масса",
+    "Привод",
+    "Класс герметичности",
+    "Рабочая среда",
+    "Исполнение по взрывозащите",
+    "Артикул",
+    "Модель",
+]
+
+VALUE_WORDS = [
+    "сталь", "чугун", "латунь", "нержавеющая", "фланцевое", "муфтовое", "под приварку",
+    "УХЛ1", "У1", "ХЛ1", "ручной", "электропривод", "пневмопривод", "вода", "пар", "газ",
+]
+
+
+def make_headers(params: int) -> list[str]:
+    return [f"{HEADER_WORDS[i % len(HEADER_WORDS)]} {i + 1}" for i in range(params)]
+
+
+def column_cardinality(index: int, rows: int) -> int:
+    # Разная кардинальность колонок: от единиц значений до почти уникальных (артикулы)
+    base = [4, 12, 40, 200, 2000][index % 5]
+    return max(1, min(base, rows))
+
+
+def make_value(rng: random.Random, column: int, cardinality: int) -> str:
+    n = rng.randrange(cardinality)
+    if column % 3 == 0:
+        return str(10 * (n + 1))
+    return f"{VALUE_WORDS[n % len(VALUE_WORDS)]}-{n}"
+
+
+def write_workbook(path: str, rows: int, params: int, seed: int = 0) -> str:
+    # write_only режим openpyxl держит в памяти только текущую строку
+    rng = random.Random(seed)
+    headers = make_headers(params)
+    cardinalities = [column_cardinality(i, rows) for i in range(params)]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Parameters")
+    ws.append(headers)
+    for _ in range(rows):
+        ws.append([make_value(rng, i, cardinalities[i]) for i in range(params)])
+
+    tmp_path = f"{path}.part"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_workbook(data_dir: str, rows: int, params: int, seed: int = 0) -> str:
+    # Сгенерированные файлы переиспользуются между запусками
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"products_{rows}x{params}_s{seed}.xlsx")
+    if not os.path.exists(path):
+        write_workbook(path, rows, params, seed)
+    return path
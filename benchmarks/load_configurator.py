@@ -0,0 +1,271 @@
+# benchmarks/load_configurator.py
+"""
+Нагрузочный сценарий конфигуратора: N одновременных пользователей листают
+GET /products/, GET /parameters/by_product/{id} и многократно get_unique_param,
+изредка запуская импорт. Уровни конкуренции растут, для каждого снимаются
+пропускная способность, p50/p95/p99, ошибки и загрузка пула соединений;
+в конце ищется точка перегиба (knee), после которой задержки деградируют.
+
+    python -m benchmarks.load_configurator --levels 1 2 4 8 16 32 64 --duration 20
+
+По умолчанию приложение работает in-process; --base-url направляет нагрузку в запущенный сервер.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from .bench_endpoints import XLSX_MEDIA_TYPE
+from .datagen import get_workbook
+from .harness import latency_summary, load_app, run_meta, write_results
+
+
+class PoolSampler:
+    # Периодически снимает число занятых соединений пула SQLAlchemy
+    def __init__(self, engine, interval: float = 0.05):
+        self.pool = engine.sync_engine.pool if engine is not None else None
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def capacity(self) -> int:
+        return self.pool.size() + max(getattr(self.pool, "_max_overflow", 0), 0)
+
+    async def _run(self):
+        while True:
+            self.samples.append(self.pool.checkedout())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pool is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict | None:
+        if self._task is None:
+            return None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        capacity = self.capacity()
+        saturated = sum(1 for s in self.samples if s >= capacity)
+        return {
+            "capacity": capacity,
+            "max_checked_out": max(self.samples, default=0),
+            "mean_checked_out": round(sum(self.samples) / len(self.samples), 2) if self.samples else 0.0,
+            "saturated_share": round(saturated / len(self.samples), 3) if self.samples else 0.0,
+        }
+
+
+class LevelStats:
+    def __init__(self):
+        self.latencies = {"products": [], "parameters": [], "unique_param": [], "import": []}
+        self.errors = 0
+
+    def record(self, kind: str, started: float, response: httpx.Response | None):
+        self.latencies[kind].append(time.perf_counter() - started)
+        if response is None or response.status_code >= 400:
+            self.errors += 1
+
+
+async def timed_request(stats: LevelStats, kind: str, call):
+    started = time.perf_counter()
+    try:
+        response = await call()
+    except httpx.HTTPError:
+        response = None
+    stats.record(kind, started, response)
+    return response
+
+
+async def virtual_user(client, products: dict, workbook: str, stats: LevelStats, deadline: float, args, rng):
+    while time.perf_counter() < deadline:
+        await timed_request(stats, "products", lambda: client.get("/api/products/", params={"limit": 50}))
+
+        product_id = rng.choice(list(products))
+        response = await timed_request(
+            stats, "parameters", lambda: client.get(f"/api/parameters/by_product/{product_id}")
+        )
+        param_ids = [p["id"] for p in response.json()] if response is not None and response.is_success else []
+
+        for param_id in rng.sample(param_ids, min(args.param_clicks, len(param_ids))):
+            await timed_request(
+                stats, "unique_param",
+                lambda: client.get(
+                    "/api/tables/get_unique_param", params={"product_id": product_id, "param_id": param_id}
+                )
+            )
+
+        if rng.random() < args.import_share:
+            async def upload():
+                with open(workbook, "rb") as f:
+                    return await client.post(
+                        "/api/tables/upload_matched_params_xlsx",
+                        params={"product_id": product_id},
+                        files={"file": (os.path.basename(workbook), f, XLSX_MEDIA_TYPE)},
+                    )
+            await timed_request(stats, "import", upload)
+
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+async def run_level(client, engine, products, workbook, level: int, args) -> dict:
+    stats = LevelStats()
+    sampler = PoolSampler(engine)
+    sampler.start()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        virtual_user(client, products, workbook, stats, deadline, args, random.Random(args.seed + i))
+        for i in range(level)
+    ))
+    elapsed = time.perf_counter() - started
+    pool = await sampler.stop()
+
+    all_latencies = [v for values in stats.latencies.values() for v in values]
+    reads = stats.latencies["products"] + stats.latencies["parameters"] + stats.latencies["unique_param"]
+    result = {
+        "name": f"c{level}",
+        "concurrency": level,
+        "endpoints": {
+            "read_path": {
+                "latency": latency_summary(reads),
+                "requests_per_s": round(len(reads) / elapsed, 2),
+            },
+            **{
+                kind: {"latency": latency_summary(values), "requests_per_s": round(len(values) / elapsed, 2)}
+                for kind, values in stats.latencies.items() if values
+            },
+        },
+        "total_requests": len(all_latencies),
+        "errors": stats.errors,
+        "pool": pool,
+    }
+    read_path = result["endpoints"]["read_path"]
+    print(
+        f"c={level:<4} rps={read_path['requests_per_s']:>9.1f}  p50={read_path['latency']['p50_ms']:>8.1f}"
+        f"  p95={read_path['latency']['p95_ms']:>8.1f}  p99={read_path['latency']['p99_ms']:>8.1f} ms"
+        f"  errors={stats.errors}  pool={pool}"
+    )
+    return result
+
+
+def find_knee(levels: list[dict], latency_factor: float, min_gain: float) -> dict | None:
+    # Перегиб — последний уровень перед тем, где p95 вырос в latency_factor раз от базового
+    # или прирост пропускной способности на удвоение конкуренции стал меньше min_gain
+    if not levels:
+        return None
+    base_p95 = levels[0]["endpoints"]["read_path"]["latency"]["p95_ms"] or 1e-9
+    knee = levels[0]
+    for prev, cur in zip(levels, levels[1:]):
+        cur_path = cur["endpoints"]["read_path"]
+        prev_rps = prev["endpoints"]["read_path"]["requests_per_s"] or 1e-9
+        gain = cur_path["requests_per_s"] / prev_rps - 1
+        if cur_path["latency"]["p95_ms"] > base_p95 * latency_factor or gain < min_gain:
+            break
+        knee = cur
+    return {
+        "concurrency": knee["concurrency"],
+        "requests_per_s": knee["endpoints"]["read_path"]["requests_per_s"],
+        "p95_ms": knee["endpoints"]["read_path"]["latency"]["p95_ms"],
+    }
+
+
+async def seed_products(client, workbook: str, count: int, products: dict) -> None:
+    # products заполняется по мере создания — при ошибке посередине созданное всё равно удаляется
+    from app.TablePakage.utils.router_utils import to_sql_name_lat
+
+    for _ in range(count):
+        name = f"load {uuid.uuid4().hex[:8]}"
+        response = await client.post("/api/products/", data={"name": name, "manufacturer": "load"})
+        response.raise_for_status()
+        product_id = response.json()["id"]
+        products[product_id] = f"{to_sql_name_lat(name)}_table"
+        with open(workbook, "rb") as f:
+            response = await client.post(
+                "/api/tables/upload_full_xlsx",
+                params={"product_id": product_id},
+                files={"file": (os.path.basename(workbook), f, XLSX_MEDIA_TYPE)},
+            )
+        response.raise_for_status()
+
+
+async def delete_products(client, products: dict) -> None:
+    # Через API, чтобы убрать и продукты в запущенном сервере (--base-url); хранилище строк удаляется вместе с продуктом
+    for product_id in products:
+        try:
+            response = await client.delete(f"/api/products/{product_id}")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"Не удалось удалить продукт {product_id}: {e}")
+
+
+async def main(args) -> None:
+    data_dir = os.path.abspath(args.data_dir)
+    output = os.path.abspath(args.output)
+    workbook = get_workbook(data_dir, args.rows, args.params, args.seed)
+    import_workbook = get_workbook(data_dir, args.import_rows, args.params, args.seed)
+
+    results = {"meta": run_meta(), "settings": vars(args), "scenarios": []}
+
+    if args.base_url:
+        app, engine = None, None
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        app, engine = load_app(tempfile.mkdtemp(prefix="agr-load-"))
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=args.timeout
+        )
+
+    products = {}
+    async with client:
+        lifespan = app.router.lifespan_context(app) if app is not None else None
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            await seed_products(client, workbook, args.products, products)
+            for level in args.levels:
+                results["scenarios"].append(await run_level(client, engine, products, import_workbook, level, args))
+        finally:
+            await delete_products(client, products)
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    results["knee"] = find_knee(results["scenarios"], args.latency_factor, args.min_gain)
+    print(f"Точка перегиба: {results['knee']}")
+    if engine is not None:
+        await engine.dispose()
+    write_results(output, results)
+    print(f"Результаты записаны в {output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест пути чтения конфигуратора")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--duration", type=float, default=20.0, help="Секунд на уровень")
+    parser.add_argument("--products", type=int, default=5, help="Сколько продуктов создать")
+    parser.add_argument("--rows", type=int, default=5000, help="Строк в таблице продукта")
+    parser.add_argument("--params", type=int, default=20, help="Параметров в таблице продукта")
+    parser.add_argument("--param-clicks", type=int, default=5, help="get_unique_param на страницу")
+    parser.add_argument("--import-share", type=float, default=0.01, help="Доля итераций с импортом")
+    parser.add_argument("--import-rows", type=int, default=200, help="Строк в импортируемом файле")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Средняя пауза пользователя, с")
+    parser.add_argument("--latency-factor", type=float, default=2.0)
+    parser.add_argument("--min-gain", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--base-url", help="Нагружать запущенный сервер вместо in-process приложения")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench/data")
+    parser.add_argument("--output", default="bench/load.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
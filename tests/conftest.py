@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os
+import sys
+
+# Тесты не открывают соединений с БД, но пакет app.TablePakage создаёт движок при импорте
+os.environ.setdefault("POSTGRES_PORT", "5432")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.TablePakage.utils.admission import AdmissionPool, parse_pools
+
+
+def test_queue_full_rejected_with_429():
+    async def scenario():
+        pool = AdmissionPool("test", limit=1, max_queue=0, wait_timeout=1)
+        await pool.acquire()
+        with pytest.raises(HTTPException) as error:
+            await pool.acquire()
+        return pool, error.value
+
+    pool, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert pool.rejected_queue_full == 1
+    assert pool.rejected_timeout == 0
+
+
+def test_wait_timeout_rejected_with_503():
+    async def scenario():
+        pool = AdmissionPool("test", limit=1, max_queue=1, wait_timeout=0.05)
+        await pool.acquire()
+        with pytest.raises(HTTPException) as error:
+            await pool.acquire()
+        return pool, error.value
+
+    pool, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert pool.rejected_timeout == 1
+    assert pool.rejected_queue_full == 0
+    assert pool.waiting == 0
+
+
+def test_waiting_request_admitted_after_release():
+    async def scenario():
+        pool = AdmissionPool("test", limit=1, max_queue=1, wait_timeout=1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.waiting == 1
+        # Очередь занята: следующий получает 429, не дожидаясь таймаута
+        with pytest.raises(HTTPException) as error:
+            await pool.acquire()
+        assert error.value.status_code == 429
+        pool.release(0.1)
+        await waiter
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.active == 1
+    assert pool.waiting == 0
+    assert pool.admitted == 2
+
+
+def test_parse_pools():
+    pools = parse_pools("import=2:4, read=32")
+    assert pools["import"].limit == 2
+    assert pools["import"].max_queue == 4
+    assert pools["read"].limit == 32
+    assert pools["read"].max_queue == 0
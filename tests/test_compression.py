@@ -0,0 +1,125 @@
+# tests/test_compression.py
+import asyncio
+import gzip
+
+import pytest
+
+from app.compression import CompressionMiddleware
+
+LARGE_BODY = b'{"rows": [' + b'"value",' * 1000 + b'"value"]}'
+
+
+def response_app(content_type: str, chunks: list[bytes], headers: list | None = None):
+    async def app(scope, receive, send):
+        raw_headers = [(b"content-type", content_type.encode()), *(headers or [])]
+        await send({"type": "http.response.start", "status": 200, "headers": raw_headers})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    return app
+
+
+def run(middleware, accept_encoding: str = "gzip") -> list[dict]:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def response_headers(messages: list[dict]) -> dict:
+    return {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+
+
+def response_body(messages: list[dict]) -> bytes:
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_large_json_is_compressed():
+    messages = run(CompressionMiddleware(response_app("application/json", [LARGE_BODY[:100], LARGE_BODY[100:]])))
+    headers = response_headers(messages)
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(response_body(messages))
+    assert gzip.decompress(response_body(messages)) == LARGE_BODY
+
+
+def test_brotli_preferred():
+    brotli = pytest.importorskip("brotli")
+    messages = run(CompressionMiddleware(response_app("application/json", [LARGE_BODY])), "gzip, br")
+    assert response_headers(messages)["content-encoding"] == "br"
+    assert brotli.decompress(response_body(messages)) == LARGE_BODY
+
+
+def test_small_body_not_compressed():
+    messages = run(CompressionMiddleware(response_app("application/json", [b'{"ok": true}'])))
+    assert "content-encoding" not in response_headers(messages)
+    assert response_body(messages) == b'{"ok": true}'
+
+
+def test_no_accept_encoding_passes_through():
+    messages = run(CompressionMiddleware(response_app("application/json", [LARGE_BODY])), "identity")
+    assert "content-encoding" not in response_headers(messages)
+    assert response_body(messages) == LARGE_BODY
+
+
+@pytest.mark.parametrize(
+    "content_type",
+    ["application/x-ndjson", "text/event-stream", "application/vnd.apache.arrow.stream"],
+)
+def test_streaming_not_buffered(content_type):
+    # Первая часть должна уйти клиенту до того, как приложение отдаст следующую
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type.encode())]})
+        await send({"type": "http.response.body", "body": LARGE_BODY, "more_body": True})
+        assert len(sent) == 2
+        await send({"type": "http.response.body", "body": LARGE_BODY})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def capture(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, capture))
+    assert "content-encoding" not in response_headers(sent)
+    assert response_body(sent) == LARGE_BODY * 2
+
+
+@pytest.mark.parametrize(
+    "content_type",
+    [
+        "image/png",
+        "application/zip",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.apache.parquet",
+    ],
+)
+def test_incompressible_passes_through(content_type):
+    messages = run(CompressionMiddleware(response_app(content_type, [LARGE_BODY])))
+    assert "content-encoding" not in response_headers(messages)
+    assert response_body(messages) == LARGE_BODY
+
+
+def test_already_encoded_passes_through():
+    encoded = gzip.compress(LARGE_BODY)
+    app = response_app("application/json", [encoded], [(b"content-encoding", b"gzip")])
+    messages = run(CompressionMiddleware(app), "gzip, br")
+    assert response_headers(messages)["content-encoding"] == "gzip"
+    assert response_body(messages) == encoded
+
+
+def test_over_max_buffer_sent_uncompressed():
+    chunks = [LARGE_BODY] * 4
+    messages = run(CompressionMiddleware(response_app("application/json", chunks), max_buffer=len(LARGE_BODY) * 2))
+    assert "content-encoding" not in response_headers(messages)
+    assert response_body(messages) == LARGE_BODY * 4
@@ -0,0 +1,39 @@
+# tests/test_router_utils.py
+import base64
+import json
+
+import pytest
+
+from app.TablePakage.utils.router_utils import decode_cursor, encode_cursor
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("Товар", 42)
+    assert decode_cursor(cursor, str, int) == ["Товар", 42]
+    assert decode_cursor(cursor) == ["Товар", 42]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "!!!",
+        "bm90IGpzb24",  # base64 от "not json"
+        "",
+        raw_cursor({"name": "a", "id": 1}),
+        raw_cursor("a"),
+        raw_cursor(["a"]),
+        raw_cursor(["a", 1, 2]),
+        raw_cursor([1, "a"]),
+        raw_cursor(["a", "1"]),
+        raw_cursor(["a", 1.5]),
+        raw_cursor(["a", True]),
+        raw_cursor([None, 1]),
+    ],
+)
+def test_malformed_cursor_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, str, int)
@@ -0,0 +1,50 @@
+# tests/test_serialization.py
+import pytest
+from starlette.requests import Request
+
+from app.TablePakage.utils.serialization import (
+    ARROW_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    negotiate,
+)
+
+
+def make_request(accept: str | None) -> Request:
+    headers = [] if accept is None else [(b"accept", accept.encode())]
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, JSON_MEDIA_TYPE),
+        ("*/*", JSON_MEDIA_TYPE),
+        ("text/html, */*;q=0.8", JSON_MEDIA_TYPE),
+        ("application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/x-msgpack", MSGPACK_MEDIA_TYPE),
+        ("Application/Vnd.Msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/vnd.apache.arrow.file", ARROW_MEDIA_TYPE),
+        ("application/vnd.apache.arrow.stream", ARROW_MEDIA_TYPE),
+    ],
+)
+def test_negotiate_media_type(accept, expected):
+    assert negotiate(make_request(accept)) == expected
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        # Побеждает больший q, а не порядок в заголовке
+        ("application/json;q=0.5, application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/msgpack;q=0.2, application/json;q=0.9", JSON_MEDIA_TYPE),
+        ("application/json; q=0.1, application/vnd.apache.arrow.stream; q=0.7", ARROW_MEDIA_TYPE),
+        # При равном q остаётся первый
+        ("application/msgpack, application/json", MSGPACK_MEDIA_TYPE),
+        # Неверный q считается нулём, q=0 — «не принимается»
+        ("application/msgpack;q=abc", JSON_MEDIA_TYPE),
+        ("application/msgpack;q=0", JSON_MEDIA_TYPE),
+    ],
+)
+def test_negotiate_q_values(accept, expected):
+    assert negotiate(make_request(accept)) == expected